@@ -1,15 +1,32 @@
+import asyncio
+import hashlib
 import openai
 import os
-from fastapi import APIRouter, Request
+from collections import OrderedDict
+from fastapi import APIRouter, HTTPException, Request
 
 router = APIRouter()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-@router.post("/classify-story")
-async def classify(request: Request):
-    data = await request.json()
-    story = data.get("text", "")
+MAX_CHARS = 1500
+MAX_CONCURRENCY = int(os.getenv("CLASSIFY_CONCURRENCY", "8"))
+MAX_BATCH = int(os.getenv("CLASSIFY_MAX_BATCH", "100"))
+CACHE_SIZE = int(os.getenv("CLASSIFY_CACHE_SIZE", "4096"))
+
+# Created on first use so they bind to the server's running event loop
+_limiter = None
+_cache = OrderedDict()
+_in_flight = {}
+
 
+def _semaphore() -> asyncio.Semaphore:
+    global _limiter
+    if _limiter is None:
+        _limiter = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _limiter
+
+
+async def _complete(excerpt: str) -> str:
     prompt = f"""
     Analyze this story and return:
     - Genre
@@ -18,12 +35,61 @@ async def classify(request: Request):
     - Vibe ("for fans of...")
 
     Story:
-    {story[:1500]}
+    {excerpt}
     """
 
-    response = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": prompt}]
-    )
+    async with _semaphore():
+        response = await openai.ChatCompletion.acreate(
+            model="gpt-4",
+            messages=[{"role": "user", "content": prompt}]
+        )
+    return response.choices[0].message["content"]
+
+
+async def classify_text(story: str) -> str:
+    # Only the first MAX_CHARS reach the model, so they are the whole cache key
+    excerpt = story[:MAX_CHARS]
+    key = hashlib.sha256(excerpt.encode("utf-8")).hexdigest()
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+
+    # Identical stories arriving together share one upstream call
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_complete(excerpt))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    # Shielded so one client disconnecting doesn't cancel the call for the others
+    result = await asyncio.shield(task)
+
+    _cache[key] = result
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return result
+
+
+@router.post("/classify-story")
+async def classify(request: Request):
+    data = await request.json()
+    story = data.get("text", "")
+    return {"result": await classify_text(story)}
+
+
+@router.post("/classify-story/batch")
+async def classify_batch(request: Request):
+    data = await request.json()
+    texts = data.get("texts", [])
+    if not isinstance(texts, list):
+        raise HTTPException(status_code=422, detail="'texts' must be a list of strings")
+    if len(texts) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH} stories per batch")
 
-    return {"result": response.choices[0].message["content"]}
+    # Fan-out is bounded by the shared semaphore, so a large batch queues rather than floods
+    outcomes = await asyncio.gather(*(classify_text(str(text)) for text in texts), return_exceptions=True)
+    return {
+        "results": [
+            {"error": str(outcome)} if isinstance(outcome, Exception) else {"result": outcome}
+            for outcome in outcomes
+        ]
+    }
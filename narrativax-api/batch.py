@@ -0,0 +1,155 @@
+"""Headless batch generation: one book per line of a JSONL file.
+
+Each line is a book config with ``prompt``, ``genre``, ``tone``,
+``chapters``, ``model`` and ``img_model``, plus an optional ``project_id``
+(8-64 lowercase hex characters, as the project store requires).
+Books run across a process pool that shares one requests-per-minute budget
+per provider. Every finished book is written to the project store, and the
+run ends with throughput and per-book latency percentiles.
+
+A book's journal and project IDs are derived from its config line, so
+rerunning an interrupted batch skips saved books and resumes half-finished
+ones from their journals.
+
+    python batch.py catalog.jsonl --processes 4 --openrouter-rpm 120 --report report.json
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List
+
+from ratelimit import SharedRateLimiter, set_rate_limiter
+
+REQUIRED = ("prompt", "genre", "tone", "chapters")
+PERCENTILES = (50, 90, 99)
+
+
+def load_configs(path: str) -> List[dict]:
+    from pipeline import IMAGE_MODELS, TEXT_MODELS, TONE_MAP
+    from project_store import PROJECT_ID
+
+    configs = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                config = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {number}: invalid JSON ({e})") from None
+            missing = [key for key in REQUIRED if key not in config]
+            if missing:
+                raise ValueError(f"Line {number}: missing {', '.join(missing)}")
+            config.setdefault("model", TEXT_MODELS[0])
+            config.setdefault("img_model", next(iter(IMAGE_MODELS)))
+            if config["tone"] not in TONE_MAP:
+                raise ValueError(f"Line {number}: unknown tone {config['tone']!r}")
+            if config["img_model"] not in IMAGE_MODELS:
+                raise ValueError(f"Line {number}: unknown image model {config['img_model']!r}")
+            if not 1 <= int(config["chapters"]) <= 30:
+                raise ValueError(f"Line {number}: chapters must be between 1 and 30")
+            if "project_id" in config and not PROJECT_ID.match(str(config["project_id"])):
+                raise ValueError(f"Line {number}: project_id must be 8-64 lowercase hex characters")
+            key = hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+            config.update(chapters=int(config["chapters"]), journal_id=key[:32], narrate=False, line=number)
+            config.setdefault("project_id", key[:16])
+            configs.append(config)
+    return configs
+
+
+def init_worker(limiter: SharedRateLimiter, offline: bool):
+    set_rate_limiter(limiter)
+    if offline:
+        from fake_backends import FakeProviders
+        FakeProviders().start().install()
+
+
+def generate_book(config: dict) -> dict:
+    from jobs import Job
+    from pipeline import run_generation
+    from project_store import open_project
+
+    started = time.monotonic()
+    try:
+        project = open_project(config["project_id"])
+        if project.exists():
+            return {"line": config["line"], "project_id": config["project_id"], "skipped": True, "seconds": 0.0}
+        result = run_generation(Job("batch", run_generation, config))
+        project.save(result["book"], result["outline"], result["characters"], result["image_cache"], result["cover"],
+                     result["config"])
+    except Exception as e:
+        return {"line": config["line"], "project_id": config["project_id"], "error": str(e),
+                "seconds": time.monotonic() - started}
+    return {"line": config["line"], "project_id": config["project_id"], "seconds": time.monotonic() - started,
+            "sections": len(result["book"]), "timings": result["timings"]}
+
+
+def percentile(values: List[float], q: float) -> float:
+    # Nearest-rank, which stays meaningful for the handful of books a small batch has
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, -(-len(ordered) * q // 100) - 1))] if ordered else 0.0
+
+
+def summarize(results: List[dict], wall: float) -> dict:
+    done = [r for r in results if not r.get("error") and not r.get("skipped")]
+    latencies = [r["seconds"] for r in done]
+    return {
+        "books": len(results),
+        "generated": len(done),
+        "skipped": sum(1 for r in results if r.get("skipped")),
+        "failed": sum(1 for r in results if r.get("error")),
+        "wall_seconds": round(wall, 1),
+        "books_per_hour": round(len(done) / wall * 3600, 2) if wall else 0.0,
+        "latency_seconds": {
+            **{f"p{q}": round(percentile(latencies, q), 1) for q in PERCENTILES},
+            "max": round(max(latencies, default=0.0), 1),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("configs", help="JSONL file with one book config per line")
+    parser.add_argument("--processes", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--openrouter-rpm", type=float, default=float(os.getenv("NARRATIVAX_OPENROUTER_RPM", "0")),
+                        help="requests per minute to OpenRouter across all processes (0 = unlimited)")
+    parser.add_argument("--replicate-rpm", type=float, default=float(os.getenv("NARRATIVAX_REPLICATE_RPM", "0")),
+                        help="predictions per minute on Replicate across all processes (0 = unlimited)")
+    parser.add_argument("--report", help="write the summary and per-book results as JSON")
+    parser.add_argument("--offline", action="store_true", help="use the local provider stand-ins")
+    args = parser.parse_args()
+
+    try:
+        configs = load_configs(args.configs)
+    except ValueError as e:
+        parser.error(f"{args.configs}: {e}")
+    # Spawned rather than forked: workers start clean instead of inheriting the parent's threads and pools
+    context = multiprocessing.get_context("spawn")
+    limiter = SharedRateLimiter({"openrouter": args.openrouter_rpm, "replicate": args.replicate_rpm}, context=context)
+
+    results, started = [], time.monotonic()
+    with ProcessPoolExecutor(max_workers=args.processes, mp_context=context,
+                             initializer=init_worker, initargs=(limiter, args.offline)) as pool:
+        futures = [pool.submit(generate_book, config) for config in configs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            status = "skipped (already saved)" if result.get("skipped") else \
+                f"failed: {result['error']}" if result.get("error") else f"{result['seconds']:.1f}s"
+            print(f"[{len(results)}/{len(configs)}] line {result['line']} -> {result['project_id']}: {status}", flush=True)
+
+    summary = summarize(results, time.monotonic() - started)
+    print(json.dumps(summary, indent=2))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"summary": summary, "books": sorted(results, key=lambda r: r["line"])}, f, indent=2)
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
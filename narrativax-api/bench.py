@@ -0,0 +1,257 @@
+"""Offline end-to-end benchmark for the book pipeline.
+
+Runs generation, export, project save/load and a read through the viewer
+(every section, every page) for a few book sizes against local stand-ins for OpenRouter, Replicate and TTS,
+so results are repeatable and cost nothing. Every knob, including the fake backends' settings and any
+NARRATIVAX_* variables in the environment, is saved with the results so a
+run can be repeated. Each size runs in its own
+process with a fresh cache directory, which keeps peak RSS per scenario
+honest and every run cold. Startup cost is measured separately by importing
+the app's modules in fresh interpreters.
+
+    python bench.py --out results.json
+    python bench.py --out after.json --compare results.json
+    python bench.py --startup-only
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SIZES = (4, 10, 30)
+PHASES = ("generate", "export_cold", "export_cached", "save", "load", "view")
+# Everything main.py imports besides Streamlit itself
+APP_MODULES = ("completion_cache", "image_store", "journal", "tts", "export", "jobs", "project_store",
+               "metrics", "pipeline", "viewer")
+# FakeProviders settings, passed to each worker and recorded with the results
+KNOBS = ("latency", "jitter", "error_rate", "stall_rate", "image_latency", "tts_latency", "tokens_per_second",
+         "completion_words", "seed")
+HEAVY_MODULES = ("PIL.Image", "docx", "fpdf", "gtts", "lxml", "replicate")
+STARTUP_RUNS = 7
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+@contextmanager
+def phase(timings: dict, name: str):
+    started = time.perf_counter()
+    yield
+    timings[name] = round(time.perf_counter() - started, 3)
+
+
+def run_scenario(chapters: int, args) -> dict:
+    # Imported here so the worker picks up the cache directories set by the parent
+    from export import get_exporter
+    from fake_backends import FakeProviders
+    from hedging import get_latency_tracker
+    from image_store import get_image_store
+    from jobs import JobManager
+    from pipeline import IMAGE_MODELS, run_generation
+    from project_store import open_project
+    from viewer import view_section
+
+    providers = FakeProviders(**{knob: getattr(args, knob) for knob in KNOBS}).start().install()
+    config = {
+        "prompt": "A lighthouse keeper finds letters from the future",
+        "genre": "Fantasy",
+        "tone": "Mystical",
+        "chapters": chapters,
+        "model": "fake/model",
+        "img_model": next(iter(IMAGE_MODELS)),
+        "journal_id": uuid.uuid4().hex,
+    }
+    # Nothing here runs a Streamlit script, so reruns are an estimate modelled on main.py, not a count:
+    # the submitting run, one progress run that follows the job to the end, and the rerun that swaps in
+    # the book; then, in the viewer, one run per section opened and per page turned
+    timings, reruns_estimate, redraws = {}, {"generate": 3}, 0
+
+    with phase(timings, "generate"):
+        job = JobManager(workers=1).submit("bench", run_generation, config)
+        # Stand-in for progress_animation: one placeholder redraw per event the follower yields
+        for status in job.follow():
+            redraws += 1
+        if job.error:
+            raise RuntimeError(job.error)
+    result = job.result
+    book, image_cache, cover = result["book"], result["image_cache"], result["cover"]
+
+    exporter = get_exporter()
+    with phase(timings, "export_cold"):
+        _, export_timings = exporter.export(book, image_cache, cover)
+    with phase(timings, "export_cached"):
+        exporter.export(book, image_cache, cover)
+
+    project = open_project(uuid.uuid4().hex)
+    with phase(timings, "save"):
+        project.save(book, result["outline"], result["characters"], image_cache, cover)
+    with phase(timings, "load"):
+        loaded = project.open_book()
+        for name in loaded["book"]:
+            loaded["book"][name]
+
+    pages = 0
+    with phase(timings, "view"):
+        # Each section opened and page turned does what render_viewer does
+        if loaded["cover"]:
+            get_image_store().read(loaded["cover"])
+        for name in loaded["book"]:
+            count = len(view_section(loaded["book"], name, loaded["image_cache"]).pages)
+            for _ in range(count - 1):
+                view_section(loaded["book"], name, loaded["image_cache"])
+            pages += count
+        reruns_estimate["view"] = pages
+
+    providers.stop()
+    return {
+        "chapters": chapters,
+        "seconds": timings,
+        "export_formats": {fmt: round(t["seconds"], 3) for fmt, t in export_timings.items()},
+        "steps": result["timings"]["kinds"],
+        "calls": dict(providers.calls),
+        "errors": dict(providers.errors),
+        "hedging": get_latency_tracker().snapshot(),
+        "reruns_estimate": reruns_estimate,
+        "redraws": redraws,
+        "pages": pages,
+        "dropped_events": job.events.dropped,
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def spawn(chapters: int, args) -> dict:
+    with tempfile.TemporaryDirectory(prefix="narrativax-bench-") as workdir:
+        env = dict(os.environ,
+                   NARRATIVAX_CACHE_DIR=workdir,
+                   NARRATIVAX_EXPORT_DIR=os.path.join(workdir, "exports"),
+                   NARRATIVAX_CACHE="0",
+                   NARRATIVAX_TTS_ENGINE="silent",
+                   NARRATIVAX_TIMEOUT="0")
+        os.makedirs(env["NARRATIVAX_EXPORT_DIR"])
+        cmd = [sys.executable, os.path.join(HERE, "bench.py"), "--worker", str(chapters)]
+        for knob in KNOBS:
+            cmd += [f"--{knob.replace('_', '-')}", str(getattr(args, knob))]
+        proc = subprocess.run(cmd, cwd=HERE, env=env, capture_output=True, text=True)
+        if proc.returncode:
+            raise RuntimeError(f"{chapters}-chapter run failed:\n{proc.stderr}")
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def measure_startup(runs: int = STARTUP_RUNS) -> dict:
+    """Median wall time to import the app's modules in a fresh interpreter."""
+    probe = (
+        "import sys, time\n"
+        "started = time.perf_counter()\n"
+        f"import {', '.join(APP_MODULES)}\n"
+        "elapsed = time.perf_counter() - started\n"
+        f"print(elapsed, ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    samples, loaded = [], ""
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", probe], cwd=HERE, capture_output=True, text=True, check=True).stdout
+        seconds, _, loaded = out.strip().partition(" ")
+        samples.append(float(seconds))
+
+    # -X importtime reports cumulative microseconds per module on stderr
+    trace = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {', '.join(APP_MODULES)}"],
+                           cwd=HERE, capture_output=True, text=True, check=True).stderr
+    slowest = []
+    for line in trace.splitlines()[1:]:
+        _, cumulative, name = (part.strip() for part in line.split("|"))
+        if not name.startswith(" "):
+            slowest.append((int(cumulative), name))
+    return {
+        "median_seconds": round(sorted(samples)[len(samples) // 2], 3),
+        "heavy_modules": [m for m in loaded.split(",") if m],
+        "slowest_imports": [{"module": name, "ms": round(us / 1000, 1)} for us, name in sorted(slowest, reverse=True)[:10]],
+    }
+
+
+def print_report(report: dict, baseline: dict = None):
+    old = {r["chapters"]: r for r in (baseline or {}).get("runs", [])}
+    if baseline and baseline.get("settings") != report["settings"]:
+        changed = sorted(k for k in set(report["settings"]) | set(baseline.get("settings", {}))
+                         if report["settings"].get(k) != baseline.get("settings", {}).get(k))
+        print(f"warning: baseline ran with different settings: {', '.join(changed)}")
+    startup = report.get("startup")
+    if startup:
+        line = f"startup  {startup['median_seconds']:.3f}s  heavy modules: {', '.join(startup['heavy_modules']) or 'none'}"
+        before = (baseline or {}).get("startup")
+        if before:
+            line += f"  (was {before['median_seconds']:.3f}s with {', '.join(before['heavy_modules']) or 'none'})"
+        print(line)
+        for entry in startup["slowest_imports"][:5]:
+            print(f"  {entry['module']:<28}{entry['ms']:>8.1f} ms")
+    for run in report["runs"]:
+        print(f"\n{run['chapters']} chapters  peak RSS {run['peak_rss_mb']} MB  reruns (est.) {run['reruns_estimate']}  "
+              f"redraws {run['redraws']}  pages {run['pages']}  calls {run['calls']}")
+        before = old.get(run["chapters"])
+        for name in PHASES:
+            line = f"  {name:<14}{run['seconds'][name]:>9.3f}s"
+            if before and name in before["seconds"]:
+                then = before["seconds"][name]
+                delta = (run["seconds"][name] - then) / then * 100 if then else 0.0
+                line += f"  (was {then:.3f}s, {delta:+.1f}%)"
+            print(line)
+        if before:
+            print(f"  peak RSS was {before['peak_rss_mb']} MB, estimated reruns were {before.get('reruns_estimate')}, "
+                  f"redraws were {before['redraws']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="chapter counts to run")
+    parser.add_argument("--latency", type=float, default=0.3, help="OpenRouter response latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="latency jitter as a fraction")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls that fail")
+    parser.add_argument("--stall-rate", type=float, default=0.0,
+                        help="fraction of OpenRouter calls whose first token is 20x late")
+    parser.add_argument("--image-latency", type=float, default=1.5, help="Replicate prediction latency (s)")
+    parser.add_argument("--tts-latency", type=float, default=0.05, help="per-chunk TTS latency (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=400, help="OpenRouter streaming rate")
+    parser.add_argument("--completion-words", type=int, default=600, help="words per fake completion")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the fake backends' latencies and errors")
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--startup-only", action="store_true", help="only measure module import time")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_scenario(args.worker, args)))
+        return
+
+    report = {
+        "commit": git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {"sizes": args.sizes, **{knob: getattr(args, knob) for knob in KNOBS}},
+        "environment": {k: v for k, v in sorted(os.environ.items()) if k.startswith("NARRATIVAX_")},
+        "python": sys.version.split()[0],
+        "startup": measure_startup(),
+        "runs": [] if args.startup_only else [spawn(chapters, args) for chapters in args.sizes],
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+CACHE_DIR = os.getenv("NARRATIVAX_CACHE_DIR", ".narrativax_cache")
+
+
+def completion_key(model: str, prompt: str, temperature: float, max_tokens: int, seed: Optional[int] = None) -> str:
+    raw = json.dumps([model, prompt, temperature, max_tokens, seed], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """Disk-backed LLM completion cache keyed by a hash of the request.
+
+    Entries live in SQLite in WAL mode, so worker threads and separate
+    processes can read and write the same file. Eviction is LRU on last
+    access, bounded by total bytes and by entry age. Each entry remembers
+    how long the original call took and how many characters it produced, so
+    hits can be reported as saved latency and spend.
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = 256 * 1024 * 1024, max_age: float = 30 * 86400):
+        self.path = path or os.path.join(CACHE_DIR, "completions.sqlite3")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0, "saved_chars": 0}
+        with self._conn() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS completions (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    latency REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, latency, created_at FROM completions WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or now - row[2] > self.max_age:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        with conn:
+            conn.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+        with self._lock:
+            self.stats["hits"] += 1
+            self.stats["saved_seconds"] += row[1]
+            self.stats["saved_chars"] += len(row[0])
+        return row[0]
+
+    def put(self, key: str, value: str, latency: float = 0.0):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), latency, now, now),
+            )
+        self.evict()
+
+    def evict(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM completions WHERE created_at < ?", (time.time() - self.max_age,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for key, size in conn.execute("SELECT key, size FROM completions ORDER BY accessed_at").fetchall():
+                conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_completion_cache() -> Optional[CompletionCache]:
+    """The shared cache, or None unless deterministic mode (NARRATIVAX_SEED) is on.
+
+    An unseeded call at a high temperature is meant to differ every time, so
+    replaying a stored completion would silently repeat the last book.
+    """
+    global _cache
+    if os.getenv("NARRATIVAX_CACHE", "1") != "1" or not os.getenv("NARRATIVAX_SEED"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = CompletionCache(
+                max_bytes=int(os.getenv("NARRATIVAX_CACHE_MAX_MB", "256")) * 1024 * 1024,
+                max_age=float(os.getenv("NARRATIVAX_CACHE_MAX_DAYS", "30")) * 86400,
+            )
+        return _cache
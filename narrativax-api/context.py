@@ -0,0 +1,194 @@
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("NARRATIVAX_PROMPT_TOKENS", "1500"))
+SUMMARY_SENTENCES = 2
+RECENT_CHAPTERS = 3  # chapters summarised in full before older ones shrink to one sentence
+MEMORY_SECTIONS = 12  # earlier sections the memory draws on; older ones wouldn't fit its share of the budget
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14,
+    "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19,
+}
+TENS_WORDS = {"twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90}
+ROMAN = {"i": 1, "v": 5, "x": 10, "l": 50, "c": 100}
+# The number may be digits, a Roman numeral or words, including compounds like "Twenty-One"
+HEADING = re.compile(
+    r"^[#*\s>-]*(?:(chapter|ch\.?)\s+(\d+|[a-z]+(?:[\s-]+[a-z]+)?)|(foreword|prologue|preface|epilogue|afterword))\b",
+    re.IGNORECASE | re.MULTILINE,
+)
+SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+logger = logging.getLogger("narrativax.context")
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose; close enough to budget without a tokenizer
+    return (len(text) + 3) // 4
+
+
+def trim_to_tokens(text: str, tokens: int) -> str:
+    if estimate_tokens(text) <= tokens:
+        return text
+    cut = text[:max(0, tokens * 4)]
+    return cut[:cut.rfind(" ")] + " ..." if " " in cut else cut
+
+
+def _roman(word: str) -> Optional[int]:
+    if not word or any(c not in ROMAN for c in word):
+        return None
+    total = 0
+    for i, c in enumerate(word):
+        value = ROMAN[c]
+        total += -value if i + 1 < len(word) and ROMAN[word[i + 1]] > value else value
+    # A non-canonical spelling such as "iiv" is more likely a word than a numeral
+    return total if _to_roman(total) == word else None
+
+
+def _to_roman(number: int) -> str:
+    out = ""
+    for value, letters in ((100, "c"), (90, "xc"), (50, "l"), (40, "xl"), (10, "x"), (9, "ix"), (5, "v"), (4, "iv"), (1, "i")):
+        while number >= value:
+            out += letters
+            number -= value
+    return out
+
+
+def parse_number(text: str) -> Optional[int]:
+    """Digits, Roman numerals or English number words up to ninety-nine."""
+    words = re.split(r"[\s-]+", text.strip().lower())
+    if words[0].isdigit():
+        return int(words[0])
+    if words[0] in TENS_WORDS:
+        ones = NUMBER_WORDS.get(words[1], 0) if len(words) > 1 else 0
+        return TENS_WORDS[words[0]] + (ones if ones < 10 else 0)
+    return NUMBER_WORDS.get(words[0]) or _roman(words[0])
+
+
+def _section_name(match: re.Match) -> Optional[str]:
+    if match.group(3):
+        word = match.group(3).lower()
+        return "Foreword" if word in ("foreword", "prologue", "preface") else "Epilogue"
+    number = parse_number(match.group(2))
+    return f"Chapter {number}" if number else None
+
+
+def split_outline(outline: str) -> Dict[str, str]:
+    """Slice an outline into ``{section: text}``; text before the first heading is ``overview``."""
+    slices = {}
+    matches = [(m, _section_name(m)) for m in HEADING.finditer(outline)]
+    matches = [(m, name) for m, name in matches if name]
+    slices["overview"] = outline[:matches[0][0].start()].strip() if matches else outline.strip()
+    for i, (match, name) in enumerate(matches):
+        end = matches[i + 1][0].start() if i + 1 < len(matches) else len(outline)
+        # Repeated headings (e.g. a recap list) extend the section rather than replace it
+        slices[name] = f"{slices.get(name, '')}\n{outline[match.start():end].strip()}".strip()
+    return slices
+
+
+def split_evenly(outline: str, sections: List[str]) -> Dict[str, str]:
+    """Fallback for outlines with no recognisable headings: contiguous paragraphs shared out by length."""
+    blocks = [b.strip() for b in re.split(r"\n\s*\n", outline) if b.strip()]
+    if len(blocks) < len(sections):
+        blocks = [line.strip() for line in outline.splitlines() if line.strip()]
+    total = sum(len(b) for b in blocks) or 1
+    slices, position = {}, 0
+    for block in blocks:
+        # Placed by the block's midpoint, so every section gets the part of the plan nearest its turn
+        index = min(len(sections) - 1, int((position + len(block) / 2) / total * len(sections)))
+        slices[sections[index]] = f"{slices.get(sections[index], '')}\n{block}".strip()
+        position += len(block)
+    return slices
+
+
+def memory_sources(sections: List[str], section: str) -> List[str]:
+    """The earlier sections whose text ``section``'s memory is built from."""
+    index = sections.index(section)
+    return sections[max(0, index - MEMORY_SECTIONS):index]
+
+
+def summarize(text: str, sentences: int = SUMMARY_SENTENCES) -> str:
+    parts = [p for p in SENTENCE.split(text.strip()) if p]
+    if len(parts) <= sentences:
+        return " ".join(parts)
+    # Opening and closing beats carry most of the continuity a following chapter needs
+    return " ".join(parts[:sentences - 1] + parts[-1:])
+
+
+class ContextBuilder:
+    """Builds per-section prompt context under a token budget.
+
+    The outline is sliced per section once. Each prompt gets, in priority
+    order: the section's own slice, a summary of the sections before it
+    that have been ``record``ed, the outline overview, and the neighbouring
+    slices. Lower priorities are trimmed first to fit the budget. Callers
+    record only text a prompt depends on, so the same inputs always build
+    the same prompt.
+    """
+
+    def __init__(self, outline: str, sections: List[str], budget: int = PROMPT_TOKEN_BUDGET):
+        self.outline = outline
+        self.sections = list(sections)
+        self.budget = budget
+        self.slices = split_outline(outline)
+        if len(self.slices) == 1 and self.sections:
+            # No heading parsed: rather than one overview trimmed to the budget, which cuts the later
+            # chapters' plans, give each section its proportional share of the outline
+            logger.warning("No section headings found in the outline; splitting it evenly")
+            self.slices = {"overview": "", **split_evenly(outline, self.sections)}
+        self.prompt_tokens: Dict[str, int] = {}
+        self._written: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def record(self, section: str, text: str):
+        with self._lock:
+            self._written[section] = summarize(text)
+
+    def memory(self, section: str) -> str:
+        with self._lock:
+            earlier = [(s, self._written[s]) for s in memory_sources(self.sections, section) if s in self._written]
+        lines = []
+        for i, (name, summary) in enumerate(earlier):
+            recent = i >= len(earlier) - RECENT_CHAPTERS
+            lines.append(f"{name}: {summary if recent else summarize(summary, 1)}")
+        return "\n".join(lines)
+
+    def build(self, section: str, instruction: str) -> str:
+        index = self.sections.index(section)
+        neighbours = [s for s in self.sections[max(0, index - 1):index + 2] if s != section]
+        own = self.slices.get(section, "")
+        parts = [
+            ("instruction", instruction, None),
+            ("section", own, 0.5),
+            ("memory", self.memory(section), 0.25),
+            ("overview", self.slices.get("overview", ""), 0.15),
+            ("neighbours", "\n".join(self.slices[s] for s in neighbours if s in self.slices), 0.1),
+        ]
+        labels = {
+            "section": f"Outline for {section}:",
+            "memory": "Story so far:",
+            "overview": "Story overview:",
+            "neighbours": "Surrounding outline:",
+        }
+
+        available = remaining = max(self.budget - estimate_tokens(instruction), 0)
+        chosen, carry = {}, 0
+        # Fill in priority order; whatever a part doesn't use rolls over to the next one
+        for key, text, share in parts[1:]:
+            allowance = remaining if key == "neighbours" else int(available * share) + carry
+            chosen[key] = trim_to_tokens(text, min(allowance, remaining)) if text else ""
+            used = estimate_tokens(chosen[key])
+            carry = max(allowance - used, 0)
+            remaining -= used
+
+        prompt = "\n\n".join(
+            [instruction] + [f"{labels[key]}\n{chosen[key]}" for key, _, _ in parts[1:] if chosen.get(key)]
+        )
+        tokens = estimate_tokens(prompt)
+        self.prompt_tokens[section] = tokens
+        logger.info("prompt_tokens=%d section=%s full_outline_tokens=%d", tokens, section, estimate_tokens(self.outline))
+        return prompt
@@ -0,0 +1,71 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set
+
+
+class DependencyGraph:
+    """Which artifacts are derived from which inputs.
+
+    Artifacts are named like generation steps (``text:Chapter 7``,
+    ``image:Chapter 7``), plus ``audio:``, ``chunk:`` (saved project rows)
+    and ``export:`` entries for what is derived from them. ``invalidated``
+    follows the edges to everything a change makes stale.
+    """
+
+    def __init__(self):
+        self._inputs: Dict[str, List[str]] = {}
+        self._dependents: Dict[str, Set[str]] = defaultdict(set)
+
+    def add(self, artifact: str, inputs: Iterable[str] = ()):
+        self._inputs[artifact] = list(inputs)
+        for name in self._inputs[artifact]:
+            self._dependents[name].add(artifact)
+
+    def inputs(self, artifact: str) -> List[str]:
+        return list(self._inputs.get(artifact, ()))
+
+    def invalidated(self, changed: Iterable[str], keep: Iterable[str] = ()) -> List[str]:
+        """Everything downstream of ``changed``, nearest first, excluding ``changed`` itself.
+
+        Artifacts in ``keep`` are deliberately left as they are, so nothing
+        derived only through them is invalidated.
+        """
+        changed = list(changed)
+        seen, order, frontier = set(changed) | set(keep), [], changed
+        while frontier:
+            following = []
+            for name in frontier:
+                for dependent in sorted(self._dependents.get(name, ())):
+                    if dependent not in seen:
+                        seen.add(dependent)
+                        order.append(dependent)
+                        following.append(dependent)
+            frontier = following
+        return order
+
+    def __contains__(self, artifact: str) -> bool:
+        return artifact in self._inputs
+
+
+def book_dependencies(sections: List[str], formats: Iterable[str] = ()) -> DependencyGraph:
+    """The artifact graph of one book: its generation steps and everything derived from them."""
+    graph = DependencyGraph()
+    graph.add("premise")
+    graph.add("outline", ["premise"])
+    graph.add("characters", ["outline"])
+    graph.add("cover", ["premise"])
+    graph.add("chunk:outline", ["outline"])
+    graph.add("chunk:characters", ["characters"])
+    graph.add("chunk:image:cover", ["cover"])
+    for sec in sections:
+        # Sections read their slice of the outline; earlier chapters' text is context, not an input
+        graph.add(f"text:{sec}", ["outline"])
+        graph.add(f"image:{sec}", [f"text:{sec}"])
+        graph.add(f"audio:{sec}", [f"text:{sec}"])
+        graph.add(f"chunk:{sec}", [f"text:{sec}"])
+        graph.add(f"chunk:image:{sec}", [f"image:{sec}"])
+    for fmt in formats:
+        if fmt == "mp3":
+            graph.add("export:mp3", [f"audio:{sec}" for sec in sections])
+        else:
+            graph.add(f"export:{fmt}", ["cover"] + [f"{kind}:{sec}" for sec in sections for kind in ("text", "image")])
+    return graph
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+from image_store import ImageHandle
+from metrics import span
+from plugins import EXPORTERS
+from tts import get_audio_library
+
+EXPORT_DIR = os.getenv("NARRATIVAX_EXPORT_DIR", os.path.join(os.getenv("NARRATIVAX_CACHE_DIR", ".narrativax_cache"), "exports"))
+# Archives and per-format artifacts beyond this are evicted, least recently used first
+EXPORT_CACHE_MB = float(os.getenv("NARRATIVAX_EXPORT_CACHE_MB", "1024"))
+EXPORT_VERSION = 1
+# Builders are looked up in plugins.EXPORTERS, which imports each one on first export
+FORMATS = tuple(os.getenv("NARRATIVAX_EXPORT_FORMATS", "docx,pdf,mp3").split(","))
+
+Artifacts = List[Tuple[str, str]]  # (path on disk, name inside the zip)
+
+
+def book_digest(book: dict, image_cache: dict, cover: Optional[ImageHandle], formats=FORMATS) -> str:
+    # A fresh run also keeps the cover in image_cache while a loaded project doesn't; it is hashed once, as
+    # ``cover``, so the same book has the same digest either way
+    images = {k: v.digest for k, v in image_cache.items() if isinstance(v, ImageHandle) and k != "cover"}
+    raw = json.dumps([EXPORT_VERSION, list(formats), list(book.items()), images, cover.digest if cover else None],
+                     ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class BookExporter:
+    """Builds export archives in parallel and caches them by book content.
+
+    Each format is built by its own worker in a private temporary directory
+    and promoted into the artifact cache once complete. Entries are streamed
+    into the zip as their formats finish. Re-exporting an unchanged book
+    returns the cached archive without rebuilding anything. The cache is
+    capped at ``max_bytes``; hits refresh an entry's mtime, and the oldest
+    entries are evicted after each build.
+    """
+
+    def __init__(self, root: str = EXPORT_DIR, max_bytes: int = int(EXPORT_CACHE_MB * 1024 * 1024)):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+        os.makedirs(os.path.join(root, "artifacts"), exist_ok=True)
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _artifact(self, fmt: str, book: dict, image_cache: dict, cover: Optional[ImageHandle]) -> Tuple[Artifacts, bool]:
+        if fmt == "mp3":
+            library = get_audio_library()
+            cached = all(library.cached(content) for content in book.values())
+            return EXPORTERS.get("mp3")(book, image_cache, cover, ""), cached
+
+        cache_dir = os.path.join(self.root, "artifacts", f"{fmt}-{book_digest(book, image_cache, cover, (fmt,))}")
+        manifest = os.path.join(cache_dir, "manifest.json")
+        if os.path.exists(manifest):
+            os.utime(cache_dir)
+            with open(manifest) as f:
+                return [(os.path.join(cache_dir, name), arcname) for name, arcname in json.load(f)], True
+
+        workdir = tempfile.mkdtemp(prefix=f"{fmt}-", dir=os.path.join(self.root, "artifacts"))
+        try:
+            artifacts = EXPORTERS.get(fmt)(book, image_cache, cover, workdir)
+            with open(os.path.join(workdir, "manifest.json"), "w") as f:
+                json.dump([(os.path.basename(path), arcname) for path, arcname in artifacts], f)
+            try:
+                os.rename(workdir, cache_dir)
+            except OSError:
+                # Another worker promoted the same artifact first; theirs is identical
+                shutil.rmtree(workdir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise
+        return [(os.path.join(cache_dir, os.path.basename(path)), arcname) for path, arcname in artifacts], False
+
+    def export(self, book: dict, image_cache: dict, cover: Optional[ImageHandle],
+               formats=FORMATS) -> Tuple[str, Dict[str, dict]]:
+        """Return ``(zip_path, timings)``; timings maps format to seconds and cache status."""
+        digest = book_digest(book, image_cache, cover, formats)
+        zip_path = os.path.join(self.root, f"{digest}.zip")
+        with self._lock_for(digest):
+            if os.path.exists(zip_path):
+                os.utime(zip_path)
+                return zip_path, {"zip": {"seconds": 0.0, "cached": True}}
+
+            timings = {}
+            started = time.monotonic()
+            fd, tmp = tempfile.mkstemp(suffix=".zip.tmp", dir=self.root)
+            os.close(fd)
+            try:
+                with ThreadPoolExecutor(max_workers=len(formats)) as executor:
+                    futures = {}
+                    for fmt in formats:
+                        futures[executor.submit(self._timed, fmt, book, image_cache, cover)] = fmt
+                    # Already-compressed payloads (docx, pdf, mp3) gain nothing from deflate
+                    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as zipf:
+                        for future in as_completed(futures):
+                            artifacts, timings[futures[future]] = future.result()
+                            for path, arcname in artifacts:
+                                zipf.write(path, arcname)
+                os.replace(tmp, zip_path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            timings["zip"] = {"seconds": time.monotonic() - started, "cached": False}
+        self._evict(keep=zip_path)
+        return zip_path, timings
+
+    def _evict(self, keep: str):
+        entries = []
+        for parent in (self.root, os.path.join(self.root, "artifacts")):
+            for name in os.listdir(parent):
+                path = os.path.join(parent, name)
+                # Archives and promoted artifact directories only; temp files belong to builds in progress
+                if name.endswith(".zip") or (parent != self.root and os.path.exists(os.path.join(path, "manifest.json"))):
+                    files = [os.path.join(path, f) for f in os.listdir(path)] if os.path.isdir(path) else [path]
+                    try:
+                        entries.append((os.path.getmtime(path), sum(os.path.getsize(f) for f in files), path))
+                    except OSError:
+                        continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+    def _timed(self, fmt, book, image_cache, cover):
+        with span("export", fmt) as timer:
+            artifacts, cached = self._artifact(fmt, book, image_cache, cover)
+            timer.add(cache_hits=int(cached), bytes=sum(os.path.getsize(path) for path, _ in artifacts))
+        return artifacts, {"seconds": timer.seconds, "cached": cached}
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> BookExporter:
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = BookExporter()
+        return _exporter
@@ -0,0 +1,22 @@
+import os
+from io import BytesIO
+from typing import Optional
+
+from docx import Document
+from docx.shared import Inches
+
+from export import Artifacts
+from image_store import ImageHandle, get_image_store
+
+
+def build_docx(book: dict, image_cache: dict, cover: Optional[ImageHandle], workdir: str) -> Artifacts:
+    store = get_image_store()
+    doc = Document()
+    for sec, content in book.items():
+        doc.add_heading(sec, level=1)
+        doc.add_paragraph(content)
+        if sec in image_cache:
+            doc.add_picture(BytesIO(store.portable(image_cache[sec])), width=Inches(5))
+    path = os.path.join(workdir, "book.docx")
+    doc.save(path)
+    return [(path, "book.docx")]
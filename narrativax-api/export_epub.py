@@ -0,0 +1,71 @@
+import os
+import time
+import uuid
+import zipfile
+from html import escape
+from typing import Optional
+
+from export import Artifacts
+from image_store import ImageHandle, get_image_store
+
+CONTAINER = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>"""
+
+MEDIA_TYPES = {"jpg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+
+
+def _xhtml(title: str, body: str) -> str:
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">
+<head><title>{escape(title)}</title></head>
+<body>{body}</body>
+</html>"""
+
+
+def build_epub(book: dict, image_cache: dict, cover: Optional[ImageHandle], workdir: str) -> Artifacts:
+    """EPUB 3 written with the standard library only, so it adds no dependency."""
+    store = get_image_store()
+    manifest, spine, nav = [], [], []
+    path = os.path.join(workdir, "book.epub")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as epub:
+        # The mimetype entry must come first and be stored uncompressed
+        epub.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        epub.writestr("META-INF/container.xml", CONTAINER)
+
+        images = {}
+        for key, handle in [("cover", cover)] + [(sec, image_cache.get(sec)) for sec in book]:
+            if isinstance(handle, ImageHandle) and handle.ext in MEDIA_TYPES:
+                name = f"images/{handle.digest[:16]}.{handle.ext}"
+                if name not in images.values():
+                    epub.writestr(f"OEBPS/{name}", store.read(handle), compress_type=zipfile.ZIP_STORED)
+                    properties = ' properties="cover-image"' if key == "cover" else ""
+                    manifest.append(f'<item id="img{len(images)}" href="{name}" media-type="{MEDIA_TYPES[handle.ext]}"{properties}/>')
+                images[key] = name
+
+        for i, (sec, content) in enumerate(book.items()):
+            paragraphs = "".join(f"<p>{escape(p.strip())}</p>" for p in content.split("\n") if p.strip())
+            picture = f'<img src="{images[sec]}" alt="{escape(sec)}"/>' if sec in images else ""
+            epub.writestr(f"OEBPS/section{i}.xhtml", _xhtml(sec, f"<h1>{escape(sec)}</h1>{picture}{paragraphs}"))
+            manifest.append(f'<item id="section{i}" href="section{i}.xhtml" media-type="application/xhtml+xml"/>')
+            spine.append(f'<itemref idref="section{i}"/>')
+            nav.append(f'<li><a href="section{i}.xhtml">{escape(sec)}</a></li>')
+
+        epub.writestr("OEBPS/nav.xhtml", _xhtml("Contents", f'<nav epub:type="toc"><ol>{"".join(nav)}</ol></nav>'))
+        epub.writestr("OEBPS/content.opf", f"""<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="uid">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="uid">urn:uuid:{uuid.uuid4()}</dc:identifier>
+    <dc:title>NarrativaX Book</dc:title>
+    <dc:language>en</dc:language>
+    <meta property="dcterms:modified">{time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}</meta>
+  </metadata>
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+    {"".join(manifest)}
+  </manifest>
+  <spine>{"".join(spine)}</spine>
+</package>""")
+    return [(path, "book.epub")]
@@ -0,0 +1,12 @@
+from typing import Optional
+
+from export import Artifacts
+from image_store import ImageHandle
+from tts import get_audio_library
+
+
+def build_mp3(book: dict, image_cache: dict, cover: Optional[ImageHandle], workdir: str) -> Artifacts:
+    # The audio library is already a content-addressed cache, so its files are used in place
+    library = get_audio_library()
+    futures = [library.submit(content) for content in book.values()]
+    return [(future.result(), f"chapter_{i+1}.mp3") for i, future in enumerate(futures)]
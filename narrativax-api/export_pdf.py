@@ -0,0 +1,30 @@
+import os
+from typing import Optional
+
+from fpdf import FPDF
+
+from export import Artifacts
+from image_store import ImageHandle, get_image_store, sniff_format
+
+
+def build_pdf(book: dict, image_cache: dict, cover: Optional[ImageHandle], workdir: str) -> Artifacts:
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    if cover:
+        cover_bytes = get_image_store().portable(cover)
+        # FPDF picks the decoder from the extension
+        cover_path = os.path.join(workdir, "cover.png" if sniff_format(cover_bytes) == "PNG" else "cover.jpg")
+        with open(cover_path, "wb") as f:
+            f.write(cover_bytes)
+        pdf.add_page()
+        pdf.image(cover_path, x=0, y=0, w=pdf.w, h=pdf.h)
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    for sec, content in book.items():
+        pdf.set_font("Arial", 'B', 16)
+        pdf.cell(0, 10, sec, ln=True)
+        pdf.set_font("Arial", size=12)
+        pdf.multi_cell(0, 10, content)
+    path = os.path.join(workdir, "book.pdf")
+    pdf.output(path)
+    return [(path, "book.pdf")]
@@ -0,0 +1,197 @@
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+from PIL import Image
+
+import pipeline
+from image_scheduler import get_image_scheduler
+from tts import SilentEngine, set_tts_engine
+
+STALL_FACTOR = 20
+WORDS = ("the night held its breath while she crossed the courtyard and the lanterns "
+         "flickered as if they knew what waited beyond the gate").split()
+
+
+class FakeTTSEngine(SilentEngine):
+    name = "fake"
+
+    def __init__(self, providers: "FakeProviders"):
+        self.providers = providers
+
+    def synthesize(self, text: str, lang: str, voice: str) -> bytes:
+        self.providers.pause("tts")
+        return super().synthesize(text, lang, voice)
+
+
+class FakeProviders:
+    """Offline stand-ins for OpenRouter, Replicate and Google TTS.
+
+    OpenRouter, Replicate's prediction API and the image CDN are served by a
+    local HTTP server, so the real transport (pooling, retries, SSE parsing,
+    prediction polling) is exercised; TTS is swapped in through its engine
+    hook. Every provider has its own latency, jitter and error rate, and
+    every call is counted.
+    """
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.1, error_rate: float = 0.0,
+                 image_latency: float = 1.5, tts_latency: float = 0.05, tokens_per_second: float = 400,
+                 completion_words: int = 600, stall_rate: float = 0.0, seed: int = 0):
+        self.latency = {"openrouter": latency, "replicate": image_latency, "cdn": latency / 3, "tts": tts_latency}
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # Fraction of OpenRouter calls that sit STALL_FACTOR times longer before their first byte
+        self.stall_rate = stall_rate
+        self.tokens_per_second = tokens_per_second
+        self.completion_words = completion_words
+        self.calls = Counter()
+        self.errors = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._predictions = {}
+        buffered = BytesIO()
+        Image.new("RGB", pipeline.IMAGE_SIZE, (40, 20, 60)).save(buffered, format="PNG")
+        self._image = buffered.getvalue()
+
+    # ----- shared behaviour -----
+    def _roll(self, provider: str) -> bool:
+        with self._lock:
+            self.calls[provider] += 1
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors[provider] += 1
+            return failed
+
+    def delay(self, provider: str) -> float:
+        with self._lock:
+            seconds = max(0.0, self.latency[provider] * (1 + self._random.uniform(-self.jitter, self.jitter)))
+            if provider == "openrouter" and self._random.random() < self.stall_rate:
+                seconds *= STALL_FACTOR
+            return seconds
+
+    def pause(self, provider: str):
+        time.sleep(self.delay(provider))
+
+    def completion(self, prompt: str) -> str:
+        if "JSON format" in prompt:
+            return json.dumps([{"name": f"Character {i}", "role": "lead", "personality": "curious",
+                                "appearance": "tall"} for i in range(4)])
+        if "outline" in prompt.lower() and "Write immersive" not in prompt:
+            chapters = max((int(n) for n in re.findall(r"Chapter (\d+)", prompt)), default=30)
+            body = " ".join(WORDS * 3)
+            return "Overview: " + body + "\n" + "\n".join(f"Chapter {i}: {body}" for i in range(1, chapters + 1))
+        words = [WORDS[i % len(WORDS)] for i in range(self.completion_words)]
+        return " ".join(words).capitalize() + "."
+
+    # ----- Replicate -----
+    def create_prediction(self) -> dict:
+        prediction_id = uuid.uuid4().hex
+        failed = self._roll("replicate")
+        ready_at = time.monotonic() + self.delay("replicate")
+        with self._lock:
+            self._predictions[prediction_id] = {
+                "ready_at": ready_at,
+                "status": "failed" if failed else None,
+            }
+        return self.prediction(prediction_id)
+
+    def prediction(self, prediction_id: str, cancel: bool = False) -> dict:
+        with self._lock:
+            state = self._predictions[prediction_id]
+            if cancel and state["status"] is None:
+                state["status"] = "canceled"
+            status = state["status"] or ("succeeded" if time.monotonic() >= state["ready_at"] else "processing")
+        url = f"{self.base_url}/v1/predictions/{prediction_id}"
+        return {
+            "id": prediction_id,
+            "status": status,
+            "output": [f"{self.base_url}/images/{prediction_id}.png"] if status == "succeeded" else None,
+            "error": "Fake prediction failed" if status == "failed" else None,
+            "urls": {"get": url, "cancel": f"{url}/cancel"},
+        }
+
+    # ----- HTTP server -----
+    def start(self) -> "FakeProviders":
+        providers = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body: bytes, content_type: str, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self, data: dict, status: int = 200):
+                self._send(status, json.dumps(data).encode(), "application/json")
+
+            def do_GET(self):
+                if self.path.startswith("/v1/predictions/"):
+                    self._json(providers.prediction(self.path.rsplit("/", 1)[-1]))
+                    return
+                providers.pause("cdn")
+                providers._roll("cdn")
+                self._send(200, providers._image, "image/png")
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path == "/v1/predictions":
+                    self._json(providers.create_prediction(), 201)
+                    return
+                if self.path.startswith("/v1/predictions/") and self.path.endswith("/cancel"):
+                    self._json(providers.prediction(self.path.split("/")[-2], cancel=True))
+                    return
+                providers.pause("openrouter")
+                if providers._roll("openrouter"):
+                    self._send(503, b'{"error": "overloaded"}', "application/json", {"Retry-After": "0"})
+                    return
+                text = providers.completion(payload["messages"][0]["content"])
+                if not payload.get("stream"):
+                    body = json.dumps({"choices": [{"message": {"content": text}}]}).encode()
+                    self._send(200, body, "application/json")
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                tokens = re.findall(r"\S+\s*", text)
+                for i in range(0, len(tokens), 8):
+                    chunk = {"choices": [{"delta": {"content": "".join(tokens[i:i + 8])}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    time.sleep(8 / providers.tokens_per_second)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def install(self) -> "FakeProviders":
+        pipeline.OPENROUTER_URL = f"{self.base_url}/api/v1/chat/completions"
+        get_image_scheduler().base_url = f"{self.base_url}/v1"
+        set_tts_engine(FakeTTSEngine(self))
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
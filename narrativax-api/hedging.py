@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from metrics import annotate, attach, current
+
+# A call with no first token by this percentile of its model's time-to-first-token gets a duplicate; 0 disables
+HEDGE_PERCENTILE = float(os.getenv("NARRATIVAX_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = float(os.getenv("NARRATIVAX_HEDGE_MIN_DELAY", "2"))
+HEDGE_MAX_DELAY = float(os.getenv("NARRATIVAX_HEDGE_MAX_DELAY", "30"))
+HEDGE_DEFAULT_DELAY = 15.0  # until a model has MIN_SAMPLES
+MIN_SAMPLES = 20
+WINDOW = 500
+HEDGE_WORKERS = 32
+
+# stream(prompt, model, on_response) -> tokens; on_response receives the open response so it can be closed
+Stream = Callable[..., Iterator[str]]
+
+
+class LatencyTracker:
+    """Rolling time-to-first-token samples and hedging counts per model."""
+
+    def __init__(self, window: int = WINDOW):
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, Counter] = {}
+        self._window = window
+        self._lock = threading.Lock()
+
+    def record(self, model: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self._window)).append(seconds)
+
+    def count(self, model: str, event: str):
+        with self._lock:
+            self._counts.setdefault(model, Counter())[event] += 1
+
+    def percentile(self, model: str, q: float) -> Optional[float]:
+        with self._lock:
+            ordered = sorted(self._samples.get(model, ()))
+        if not ordered:
+            return None
+        return ordered[max(0, min(len(ordered) - 1, int(-(-len(ordered) * q // 100)) - 1))]
+
+    def deadline(self, model: str) -> float:
+        """Seconds to wait for a first token before hedging a call to ``model``."""
+        with self._lock:
+            samples = len(self._samples.get(model, ()))
+        if samples < MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, self.percentile(model, HEDGE_PERCENTILE)))
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            models = set(self._samples) | set(self._counts)
+            counts = {model: dict(self._counts.get(model, {})) for model in models}
+            samples = {model: len(self._samples.get(model, ())) for model in models}
+        return {model: {"samples": samples[model],
+                        "p50": self.percentile(model, 50),
+                        "p95": self.percentile(model, 95),
+                        "deadline": self.deadline(model),
+                        **{event: counts[model].get(event, 0) for event in ("calls", "hedges", "hedge_wins", "fallbacks")}}
+                for model in sorted(models)}
+
+
+class Attempt:
+    def __init__(self, model: str):
+        self.model = model
+        self.parts: List[str] = []
+        self.error: Optional[BaseException] = None
+        self.started = time.monotonic()
+        self.first_token: Optional[float] = None
+        self.done = False
+        self.cancelled = False
+        self._response = None
+
+    def bind(self, response):
+        self._response = response
+        if self.cancelled:
+            response.close()
+
+    def cancel(self):
+        # Closing the response unblocks a read that is still waiting on the first byte
+        self.cancelled = True
+        if self._response is not None:
+            try:
+                self._response.close()
+            except Exception:
+                pass
+
+
+class _Race:
+    """Attempts at one prompt; the first to produce a token wins and the rest are cancelled."""
+
+    def __init__(self, prompt: str, stream: Stream, on_token):
+        self.prompt = prompt
+        self.stream = stream
+        self.on_token = on_token
+        self.attempts: List[Attempt] = []
+        self.winner: Optional[Attempt] = None
+        self.changed = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self, model: str) -> Attempt:
+        attempt = Attempt(model)
+        with self._lock:
+            self.attempts.append(attempt)
+        _executor().submit(self._run, attempt, current())
+        return attempt
+
+    def _run(self, attempt: Attempt, parent):
+        with attach(parent):
+            try:
+                for token in self.stream(self.prompt, attempt.model, on_response=attempt.bind):
+                    if attempt.cancelled or not self._token(attempt, token):
+                        break
+            except Exception as e:
+                attempt.error = e
+            finally:
+                attempt.done = True
+                self.changed.set()
+
+    def _token(self, attempt: Attempt, token: str) -> bool:
+        with self._lock:
+            if attempt.first_token is None:
+                # Every attempt's first token is a sample, not just the winner's
+                attempt.first_token = time.monotonic()
+                get_latency_tracker().record(attempt.model, attempt.first_token - attempt.started)
+            if self.winner is None:
+                self.winner = attempt
+                for other in self.attempts:
+                    if other is not attempt:
+                        self._abandon(other)
+                self.changed.set()
+            elif self.winner is not attempt:
+                return False
+        attempt.parts.append(token)
+        if self.on_token is not None:
+            self.on_token(token, attempt.parts)
+        return True
+
+    def _abandon(self, attempt: Attempt):
+        # Caller holds the lock. An attempt dropped while still waiting is at least this slow; leaving
+        # it out would bias the percentiles, and so the deadline, towards the attempts that won
+        if attempt.first_token is None and not attempt.done and not attempt.cancelled:
+            get_latency_tracker().record(attempt.model, time.monotonic() - attempt.started)
+        attempt.cancel()
+
+    def cancel(self):
+        with self._lock:
+            for attempt in self.attempts:
+                self._abandon(attempt)
+
+
+def hedged_stream(prompt: str, model: str, stream: Stream, on_token=None,
+                  alternate: Optional[str] = None) -> Tuple[str, str]:
+    """Stream a completion, hedging it if the first token is late; returns ``(text, model that answered)``.
+
+    Past the model's deadline a duplicate goes to ``alternate`` (or the same
+    model), and whichever attempt yields a token first is kept. An attempt
+    that fails before its first token falls over to ``alternate`` at once.
+    """
+    tracker = get_latency_tracker()
+    tracker.count(model, "calls")
+    race = _Race(prompt, stream, on_token)
+    primary = race.start(model)
+    hedge_at = time.monotonic() + tracker.deadline(model) if HEDGE_PERCENTILE else None
+    hedged = fell_back = False
+    try:
+        while True:
+            timeout = None
+            if race.winner is None and not hedged and hedge_at is not None:
+                timeout = max(0.0, hedge_at - time.monotonic())
+            race.changed.wait(timeout)
+            race.changed.clear()
+
+            winner = race.winner
+            if winner is not None:
+                if not winner.done:
+                    continue
+                if winner.error is not None:
+                    raise winner.error
+                if winner is not primary and not fell_back:
+                    tracker.count(model, "hedge_wins")
+                return "".join(winner.parts), winner.model
+
+            finished = next((a for a in race.attempts if a.done and a.error is None), None)
+            if finished is not None:
+                return "", finished.model  # finished without a single token
+            if all(attempt.done for attempt in race.attempts):
+                if hedged or not alternate or alternate == model:
+                    raise race.attempts[-1].error
+                tracker.count(model, "fallbacks")
+                race.start(alternate)
+                hedged = fell_back = True
+            elif not hedged and hedge_at is not None and time.monotonic() >= hedge_at:
+                tracker.count(model, "hedges")
+                annotate(hedges=1)
+                race.start(alternate or model)
+                hedged = True
+    finally:
+        race.cancel()
+
+
+_tracker = LatencyTracker()
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    return _tracker
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+        return _pool
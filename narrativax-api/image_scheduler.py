@@ -0,0 +1,227 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import Deque, Dict, Optional
+
+from image_store import get_image_store
+from ratelimit import throttle
+from transport import CONNECT_TIMEOUT, get_transport
+
+REPLICATE_API_URL = os.getenv("NARRATIVAX_REPLICATE_URL", "https://api.replicate.com/v1")
+MAX_PREDICTIONS = int(os.getenv("NARRATIVAX_REPLICATE_CONCURRENCY", "4"))
+POLL_INTERVAL = float(os.getenv("NARRATIVAX_REPLICATE_POLL", "1.0"))
+PREDICTION_TIMEOUT = float(os.getenv("NARRATIVAX_REPLICATE_TIMEOUT", "600"))
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_CHUNK = 64 * 1024
+
+logger = logging.getLogger("narrativax.images")
+
+
+class PredictionFailed(RuntimeError):
+    pass
+
+
+class Prediction:
+    def __init__(self, model: str, inputs: dict, group: Optional[str]):
+        self.model = model
+        self.inputs = inputs
+        self.group = group
+        self.future: Future = Future()
+        # Read by the pipeline's span once the future settles
+        self.future.counts = {"bytes": 0, "retries": 0}
+        self.id: Optional[str] = None
+        self.urls: Dict[str, str] = {}
+        self.created_at: Optional[float] = None
+
+
+class ImageScheduler:
+    """Runs Replicate predictions without holding a thread per image.
+
+    Predictions are created through Replicate's HTTP API and one poller
+    thread checks every in-flight prediction each interval, so the number of
+    images rendering at once is bounded by ``max_in_flight`` rather than by
+    worker threads. Further submissions queue. Outputs are streamed straight
+    into the image store. Cancelling a returned future, or a whole group,
+    cancels the prediction upstream as well.
+    """
+
+    def __init__(self, base_url: str = REPLICATE_API_URL, max_in_flight: int = MAX_PREDICTIONS,
+                 poll_interval: float = POLL_INTERVAL, timeout: float = PREDICTION_TIMEOUT):
+        self.base_url = base_url
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._queued: Deque[Prediction] = deque()
+        self._running: Dict[str, Prediction] = {}
+        self._wake = threading.Condition()
+        self._downloads = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS, thread_name_prefix="image-download")
+        self._poller: Optional[threading.Thread] = None
+        self._ensure_poller()
+
+    def _ensure_poller(self):
+        # Caller holds self._wake, or is the constructor. The loop guards each prediction, but should
+        # the thread still die, the next submission starts a fresh one instead of leaving futures hanging
+        if self._poller is None or not self._poller.is_alive():
+            self._poller = threading.Thread(target=self._loop, daemon=True, name="image-poller")
+            self._poller.start()
+
+    def _headers(self) -> dict:
+        return {"Authorization": f"Bearer {os.getenv('REPLICATE_API_TOKEN')}"}
+
+    def submit(self, model: str, inputs: dict, group: Optional[str] = None) -> Future:
+        """Queue a prediction; the future resolves to an ``ImageHandle``."""
+        prediction = Prediction(model, inputs, group)
+        with self._wake:
+            self._queued.append(prediction)
+            self._ensure_poller()
+            self._wake.notify()
+        return prediction.future
+
+    def cancel_group(self, group: str):
+        with self._wake:
+            pending = [p for p in list(self._queued) + list(self._running.values()) if p.group == group]
+            self._wake.notify()
+        for prediction in pending:
+            prediction.future.cancel()
+
+    @property
+    def in_flight(self) -> int:
+        with self._wake:
+            return len(self._running)
+
+    # ----- poller thread -----
+    def _loop(self):
+        while True:
+            with self._wake:
+                while not self._queued and not self._running:
+                    self._wake.wait()
+                starting = []
+                while self._queued and len(self._running) + len(starting) < self.max_in_flight:
+                    starting.append(self._queued.popleft())
+            for prediction in starting:
+                self._guarded(self._create, prediction)
+            with self._wake:
+                running = list(self._running.values())
+            for prediction in running:
+                self._guarded(self._poll, prediction)
+            with self._wake:
+                if self._running:
+                    self._wake.wait(self.poll_interval)
+
+    def _guarded(self, step, prediction: Prediction):
+        # One bad response fails its own prediction, never the poller serving all the others
+        try:
+            step(prediction)
+        except Exception as e:
+            logger.exception("Prediction %s failed in the poller", prediction.id)
+            self._forget(prediction)
+            if prediction.id is not None:
+                self._cancel_upstream(prediction)
+            self._fail(prediction, e)
+
+    def _create(self, prediction: Prediction):
+        if prediction.future.cancelled():
+            return
+        owner_name, _, version = prediction.model.partition(":")
+        if version:
+            url, body = f"{self.base_url}/predictions", {"version": version, "input": prediction.inputs}
+        else:
+            url, body = f"{self.base_url}/models/{owner_name}/predictions", {"input": prediction.inputs}
+        try:
+            throttle("replicate")
+            response = get_transport().post(url, headers=self._headers(), json=body, timeout=(CONNECT_TIMEOUT, 30))
+            prediction.future.counts["retries"] += response.retries
+            response.raise_for_status()
+            data = response.json()
+            prediction.id, prediction.urls = data["id"], data.get("urls") or {}
+        except Exception as e:
+            self._fail(prediction, e)
+            return
+        prediction.created_at = time.monotonic()
+        with self._wake:
+            self._running[prediction.id] = prediction
+
+    def _poll(self, prediction: Prediction):
+        if prediction.future.cancelled():
+            self._forget(prediction)
+            self._cancel_upstream(prediction)
+            return
+        if time.monotonic() - prediction.created_at > self.timeout:
+            self._forget(prediction)
+            self._cancel_upstream(prediction)
+            self._fail(prediction, PredictionFailed(f"Prediction {prediction.id} timed out"))
+            return
+        try:
+            response = get_transport().get(prediction.urls.get("get", f"{self.base_url}/predictions/{prediction.id}"),
+                                           headers=self._headers(), timeout=(CONNECT_TIMEOUT, 30))
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            # A failed status check isn't a failed prediction; try again next round
+            logger.warning("Polling prediction %s failed: %s", prediction.id, e)
+            return
+        status = data.get("status")
+        if status == "succeeded":
+            self._forget(prediction)
+            output = data.get("output")
+            url = output[0] if isinstance(output, list) and output else output
+            if not url:
+                self._fail(prediction, PredictionFailed(f"Prediction {prediction.id} returned no image"))
+                return
+            self._downloads.submit(self._download, prediction, url)
+        elif status in ("failed", "canceled"):
+            self._forget(prediction)
+            self._fail(prediction, PredictionFailed(f"Prediction {prediction.id} {status}: {data.get('error')}"))
+
+    def _forget(self, prediction: Prediction):
+        with self._wake:
+            self._running.pop(prediction.id, None)
+
+    def _cancel_upstream(self, prediction: Prediction):
+        try:
+            get_transport().post(prediction.urls.get("cancel", f"{self.base_url}/predictions/{prediction.id}/cancel"),
+                                 headers=self._headers(), timeout=(CONNECT_TIMEOUT, 10))
+        except Exception as e:
+            logger.warning("Cancelling prediction %s failed: %s", prediction.id, e)
+
+    def _fail(self, prediction: Prediction, error: Exception):
+        try:
+            prediction.future.set_exception(error)
+        except InvalidStateError:
+            pass  # cancelled in the meantime
+
+    def _download(self, prediction: Prediction, url: str):
+        if prediction.future.cancelled():
+            return
+        try:
+            with get_transport().get(url, timeout=(CONNECT_TIMEOUT, 30), stream=True) as response:
+                prediction.future.counts["retries"] += response.retries
+                response.raise_for_status()
+
+                def chunks():
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK):
+                        prediction.future.counts["bytes"] += len(chunk)
+                        yield chunk
+                handle = get_image_store().put_stream(chunks())
+        except Exception as e:
+            self._fail(prediction, e)
+            return
+        try:
+            prediction.future.set_result(handle)
+        except InvalidStateError:
+            pass
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_image_scheduler() -> ImageScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ImageScheduler()
+        return _scheduler
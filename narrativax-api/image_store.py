@@ -0,0 +1,201 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import TYPE_CHECKING, Iterable, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+STORE_DIR = os.getenv("NARRATIVAX_IMAGE_DIR", os.path.join(os.getenv("NARRATIVAX_CACHE_DIR", ".narrativax_cache"), "images"))
+IMAGE_FORMAT = os.getenv("NARRATIVAX_IMAGE_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("NARRATIVAX_IMAGE_QUALITY", "85"))
+THUMB_SIZE = (384, 512)
+DECODED_CACHE_BYTES = int(os.getenv("NARRATIVAX_DECODED_CACHE_MB", "64")) * 1024 * 1024
+
+EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}
+MAGIC = {b"\xff\xd8\xff": "JPEG", b"\x89PNG": "PNG", b"RIFF": "WEBP"}
+# Formats python-docx and FPDF can embed directly
+PORTABLE_FORMATS = {"JPEG", "PNG"}
+
+
+class ImageHandle(NamedTuple):
+    """What session state holds instead of the image: a digest and an extension."""
+    digest: str
+    ext: str
+
+    @property
+    def format(self) -> str:
+        return next(fmt for fmt, ext in EXTENSIONS.items() if ext == self.ext)
+
+
+def sniff_format(data: bytes) -> Optional[str]:
+    for magic, fmt in MAGIC.items():
+        if data.startswith(magic):
+            return fmt
+    return None
+
+
+class ImageStore:
+    """Content-addressed image files with pre-rendered thumbnails.
+
+    Each image is encoded once in a compact format and written under its
+    sha256, so identical images share one file. ``read`` and ``thumbnail``
+    hand back encoded bytes without touching PIL; ``open`` decodes through a
+    per-process LRU capped at ``decoded_cache_bytes``.
+    """
+
+    def __init__(self, root: str = STORE_DIR, fmt: str = IMAGE_FORMAT, quality: int = IMAGE_QUALITY,
+                 decoded_cache_bytes: int = DECODED_CACHE_BYTES):
+        self.root = root
+        self.fmt = fmt
+        self.quality = quality
+        self.decoded_cache_bytes = decoded_cache_bytes
+        self._decoded = OrderedDict()
+        self._decoded_bytes = 0
+        self._sources = []
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, handle: ImageHandle, thumb: bool = False) -> str:
+        name = f"{handle.digest}.thumb.{handle.ext}" if thumb else f"{handle.digest}.{handle.ext}"
+        return os.path.join(self.root, handle.digest[:2], name)
+
+    def _write(self, path: str, data: bytes):
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so concurrent writers of the same digest never expose a partial file
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _encode(self, image: "Image.Image", fmt: str) -> bytes:
+        buffered = BytesIO()
+        if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(buffered, format=fmt, quality=self.quality)
+        return buffered.getvalue()
+
+    def put(self, image: "Image.Image") -> ImageHandle:
+        return self._put(self._encode(image, self.fmt), self.fmt, image)
+
+    def put_bytes(self, data: bytes) -> ImageHandle:
+        fmt = sniff_format(data)
+        if fmt == self.fmt:
+            return self._put(data, fmt)
+        # Foreign formats (e.g. PNGs from older projects) are re-encoded once
+        from PIL import Image
+        return self.put(Image.open(BytesIO(data)))
+
+    def put_stream(self, chunks: Iterable[bytes]) -> ImageHandle:
+        """Store an image as it downloads, hashing on the way to disk.
+
+        The download always goes to a temporary file. An image already in the
+        store's format is renamed into place; any other format is re-encoded
+        from that file, so the raw download is never held in memory.
+        """
+        digest = hashlib.sha256()
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, f"incoming.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            head = b""
+            with open(tmp, "wb") as f:
+                for chunk in chunks:
+                    if len(head) < 16:
+                        head += chunk[:16]
+                    digest.update(chunk)
+                    f.write(chunk)
+            if sniff_format(head) != self.fmt:
+                from PIL import Image
+                with Image.open(tmp) as image:
+                    image.load()
+                    return self.put(image)
+            handle = ImageHandle(digest.hexdigest(), EXTENSIONS[self.fmt])
+            path = self.path(handle)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self._thumbnail(handle, self.fmt)
+        return handle
+
+    def _put(self, data: bytes, fmt: str, image: "Image.Image" = None) -> ImageHandle:
+        handle = ImageHandle(hashlib.sha256(data).hexdigest(), EXTENSIONS[fmt])
+        self._write(self.path(handle), data)
+        self._thumbnail(handle, fmt, image)
+        return handle
+
+    def _thumbnail(self, handle: ImageHandle, fmt: str, image: "Image.Image" = None):
+        thumb_path = self.path(handle, thumb=True)
+        if not os.path.exists(thumb_path):
+            from PIL import Image
+            thumb = (image or Image.open(self.path(handle))).copy()
+            thumb.thumbnail(THUMB_SIZE)
+            self._write(thumb_path, self._encode(thumb, fmt))
+
+    def add_source(self, fetch):
+        """Register ``fetch(digest) -> bytes | None`` to fill in images missing from disk."""
+        with self._lock:
+            if fetch not in self._sources:
+                self._sources = [fetch] + self._sources[:15]
+
+    def read(self, handle: ImageHandle) -> bytes:
+        path = self.path(handle)
+        if not os.path.exists(path):
+            for fetch in list(self._sources):
+                data = fetch(handle.digest)
+                if data is not None:
+                    self._write(path, data)
+                    return data
+        with open(path, "rb") as f:
+            return f.read()
+
+    def thumbnail(self, handle: ImageHandle) -> bytes:
+        path = self.path(handle, thumb=True)
+        if not os.path.exists(path):
+            return self.read(handle)
+        with open(path, "rb") as f:
+            return f.read()
+
+    def portable(self, handle: ImageHandle) -> bytes:
+        if handle.format in PORTABLE_FORMATS:
+            return self.read(handle)
+        return self._encode(self.open(handle), "PNG")
+
+    def open(self, handle: ImageHandle) -> "Image.Image":
+        with self._lock:
+            if handle.digest in self._decoded:
+                self._decoded.move_to_end(handle.digest)
+                return self._decoded[handle.digest]
+        # PIL is imported on first decode; serving stored bytes never needs it
+        from PIL import Image
+        image = Image.open(BytesIO(self.read(handle)))
+        image.load()
+        size = image.width * image.height * len(image.getbands())
+        with self._lock:
+            if handle.digest not in self._decoded:
+                self._decoded[handle.digest] = image
+                self._decoded_bytes += size
+            while self._decoded_bytes > self.decoded_cache_bytes and len(self._decoded) > 1:
+                _, evicted = self._decoded.popitem(last=False)
+                self._decoded_bytes -= evicted.width * evicted.height * len(evicted.getbands())
+        return image
+
+    def exists(self, handle: ImageHandle) -> bool:
+        return os.path.exists(self.path(handle))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_image_store() -> ImageStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ImageStore()
+        return _store
@@ -0,0 +1,258 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+JOB_WORKERS = int(os.getenv("NARRATIVAX_JOB_WORKERS", "4"))
+MAX_QUEUED_JOBS = int(os.getenv("NARRATIVAX_MAX_QUEUED_JOBS", "16"))
+MAX_JOBS_PER_SESSION = int(os.getenv("NARRATIVAX_MAX_JOBS_PER_SESSION", "1"))
+EVENT_BACKLOG = 64
+FOLLOW_COALESCE = 0.25  # seconds to let a burst of events pile up before reporting
+FOLLOW_MIN_WAIT = 0.5
+FOLLOW_MAX_WAIT = 5.0
+JOB_RETENTION = 3600  # seconds a finished job stays retrievable
+# A job nobody has followed for this long belongs to a closed tab; it is cancelled to free its slot and quota
+ABANDON_AFTER = float(os.getenv("NARRATIVAX_ABANDON_AFTER", "120"))
+
+TERMINAL_EVENTS = ("COMPLETE", "ERROR")
+
+
+logger = logging.getLogger("narrativax.jobs")
+
+
+class JobRejected(Exception):
+    pass
+
+
+class EventChannel:
+    """Bounded per-job event queue.
+
+    Events are ``(kind, message, progress, preview)`` tuples. When the backlog
+    is full the oldest progress event is dropped, since only the latest one
+    matters to a progress bar; COMPLETE and ERROR are never dropped.
+    """
+
+    def __init__(self, maxlen: int = EVENT_BACKLOG):
+        self.maxlen = maxlen
+        self.dropped = 0
+        self._events: Deque[tuple] = deque()
+        self._cond = threading.Condition()
+
+    def put(self, event: tuple):
+        with self._cond:
+            if len(self._events) >= self.maxlen:
+                for i, queued in enumerate(self._events):
+                    if queued[0] not in TERMINAL_EVENTS:
+                        del self._events[i]
+                        self.dropped += 1
+                        break
+            self._events.append(event)
+            self._cond.notify_all()
+
+    def drain(self) -> List[tuple]:
+        with self._cond:
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    def wait(self, timeout: float) -> bool:
+        with self._cond:
+            if not self._events:
+                self._cond.wait(timeout)
+            return bool(self._events)
+
+
+class Job:
+    def __init__(self, session_id: str, fn: Callable[["Job"], Any], config: dict):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.fn = fn
+        self.config = config
+        self.events = EventChannel()
+        self.status = "queued"
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # Stamped by follow() each time it polls; the manager cancels jobs whose follower has gone
+        self.last_seen = time.time()
+        self.cancelled = threading.Event()
+        # Cost of watching the job: script reruns, placeholder redraws and UI-side CPU
+        self.ui_stats = {"reruns": 0, "renders": 0, "cpu_seconds": 0.0}
+        self._on_cancel: List[Callable[[], None]] = []
+
+    def emit(self, kind: str, message: str, progress: float = 0.0, preview: str = ""):
+        self.events.put((kind, message, progress, preview))
+
+    def on_cancel(self, callback: Callable[[], None]):
+        self._on_cancel.append(callback)
+        if self.cancelled.is_set():
+            callback()
+
+    def cancel(self):
+        self.cancelled.set()
+        for callback in list(self._on_cancel):
+            callback()
+
+    def follow(self, coalesce: float = FOLLOW_COALESCE, min_wait: float = FOLLOW_MIN_WAIT,
+               max_wait: float = FOLLOW_MAX_WAIT) -> Iterator[tuple]:
+        """Yield one event per burst: the newest, or the terminal one, which ends the stream.
+
+        The wait backs off while nothing arrives, so an idle follower costs
+        next to nothing.
+        """
+        wait = min_wait
+        while True:
+            self.last_seen = time.time()
+            if not self.events.wait(wait):
+                wait = min(wait * 2, max_wait)
+                continue
+            time.sleep(coalesce)
+            events = self.events.drain()
+            status = next((e for e in events if e[0] in TERMINAL_EVENTS), events[-1] if events else None)
+            if status is None:
+                continue
+            yield status
+            if status[0] in TERMINAL_EVENTS:
+                return
+            wait = min_wait
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+
+class JobManager:
+    """Process-wide job scheduler shared by every Streamlit session.
+
+    Jobs run on one bounded worker pool. Admission control caps both the
+    global backlog and the number of unfinished jobs per session, and queued
+    jobs are dispatched round-robin across sessions so one user's batch
+    can't starve everyone else. An unfinished job whose follower has not
+    polled for ``abandon_after`` seconds is cancelled; 0 keeps jobs running
+    regardless.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = MAX_QUEUED_JOBS,
+                 per_session: int = MAX_JOBS_PER_SESSION, abandon_after: float = ABANDON_AFTER):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.per_session = per_session
+        self.abandon_after = abandon_after
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._queues: "OrderedDict[str, Deque[Job]]" = OrderedDict()
+        self._running = 0
+        self._lock = threading.Lock()
+        if abandon_after:
+            threading.Thread(target=self._reap, daemon=True, name="job-reaper").start()
+
+    def submit(self, session_id: str, fn: Callable[[Job], Any], config: dict) -> Job:
+        with self._lock:
+            self._prune()
+            queued = sum(len(q) for q in self._queues.values())
+            if queued >= self.max_queued:
+                raise JobRejected(f"The server is busy with {queued} queued books; please try again shortly")
+            mine = [j for j in self._jobs.values() if j.session_id == session_id and j.active]
+            if len(mine) >= self.per_session:
+                raise JobRejected("You already have a book in progress")
+            job = Job(session_id, fn, config)
+            self._jobs[job.id] = job
+            self._queues.setdefault(session_id, deque()).append(job)
+            self._dispatch()
+            if job.status == "queued":
+                ahead = sum(len(q) for q in self._queues.values()) - 1
+                job.emit("⏳", f"Waiting for a free writer ({ahead} ahead)...")
+            return job
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def cancel(self, job_id: str):
+        job = self.get(job_id)
+        if job is None:
+            return
+        with self._lock:
+            queue = self._queues.get(job.session_id)
+            if queue and job in queue:
+                queue.remove(job)
+                if not queue:
+                    del self._queues[job.session_id]
+                job.status = "cancelled"
+                job.error = "Cancelled before it started"
+                job.finished_at = time.time()
+                # A running job ends with ERROR when its fn raises; a queued one never runs, so end it here
+                job.emit("ERROR", f"Generation failed: {job.error}")
+        job.cancel()
+
+    def _dispatch(self):
+        # Caller holds the lock. Rotate through sessions so each gets a turn.
+        while self._running < self.workers and self._queues:
+            session_id, queue = next(iter(self._queues.items()))
+            del self._queues[session_id]
+            job = queue.popleft()
+            if queue:
+                self._queues[session_id] = queue
+            job.status = "running"
+            job.started_at = time.time()
+            self._running += 1
+            self._executor.submit(self._run, job)
+
+    def _run(self, job: Job):
+        try:
+            job.result = job.fn(job)
+            job.status = "done"
+            # Emitted here rather than by fn, so listeners never see COMPLETE before the result
+            job.emit("COMPLETE", "Job complete", 1.0)
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+            job.emit("ERROR", f"Generation failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._running -= 1
+                self._dispatch()
+
+    def _reap(self):
+        while True:
+            time.sleep(min(self.abandon_after / 4, 10.0))
+            cutoff = time.time() - self.abandon_after
+            with self._lock:
+                abandoned = [j for j in self._jobs.values() if j.active and j.last_seen < cutoff
+                             and not j.cancelled.is_set()]
+            for job in abandoned:
+                logger.info("Cancelling job %s of session %s: not followed for %.0fs",
+                            job.id, job.session_id, time.time() - job.last_seen)
+                self.cancel(job.id)
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "running": self._running,
+                "queued": sum(len(q) for q in self._queues.values()),
+                "workers": self.workers,
+            }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
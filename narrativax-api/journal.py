@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from image_store import ImageHandle
+
+JOURNAL_DIR = os.getenv("NARRATIVAX_JOURNAL_DIR", os.path.join(os.getenv("NARRATIVAX_CACHE_DIR", ".narrativax_cache"), "journals"))
+COMPLETE = "__complete__"
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, ImageHandle):
+        return {"__image__": list(value)}
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict) and "__image__" in value:
+        return ImageHandle(*value["__image__"])
+    return value
+
+
+class Journal:
+    """Append-only checkpoint log for one generation job.
+
+    The first record is the job config; every finished step is appended as
+    its own fsync'd JSON line. A crash can at worst tear the last line, which
+    ``load`` skips, so everything before it can be replayed on resume.
+    """
+
+    def __init__(self, job_id: str, root: str = JOURNAL_DIR):
+        self.job_id = job_id
+        self.path = os.path.join(root, f"{job_id}.jsonl")
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _append(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start(self, config: dict):
+        if not self.exists():
+            self._append({"config": config, "at": time.time()})
+            return
+        # Terminate a line torn by a crash so the next record starts cleanly
+        with self._lock, open(self.path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+
+    def record(self, step: str, result: Any):
+        self._append({"step": step, "result": _encode(result), "at": time.time()})
+
+    def complete(self):
+        self._append({"step": COMPLETE, "at": time.time()})
+
+    def load(self) -> Tuple[Optional[dict], Dict[str, Any], bool]:
+        """Return ``(config, completed_steps, finished)`` from what is on disk."""
+        config, completed, finished = None, {}, False
+        if not self.exists():
+            return config, completed, finished
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "config" in record:
+                    config = record["config"]
+                elif record.get("step") == COMPLETE:
+                    finished = True
+                elif "step" in record:
+                    completed[record["step"]] = _decode(record["result"])
+        return config, completed, finished
+
+    def resumable(self) -> bool:
+        config, _, finished = self.load()
+        return config is not None and not finished
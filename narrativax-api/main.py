@@ -1,24 +1,21 @@
+import hashlib
 import os
-import json
-import requests
-import zipfile
 import random
-import replicate
-import threading
-import queue
-import base64
+import logging
 import time
+import uuid
 from html import escape
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
-from docx import Document
-from docx.shared import Inches
-from fpdf import FPDF
-from tempfile import NamedTemporaryFile
-from gtts import gTTS
-from PIL import Image
-from io import BytesIO
 import streamlit as st
-from streamlit.runtime.scriptrunner import add_script_run_ctx
+from completion_cache import get_completion_cache
+from image_store import get_image_store
+from journal import Journal
+from export import get_exporter
+from jobs import Job, JobRejected, get_job_manager
+from project_store import LEGACY_PATH, import_legacy, open_project
+from hedging import get_latency_tracker
+from metrics import start_metrics_server
+from pipeline import IMAGE_MODELS, PREVIEW_CHARS, TEXT_MODELS, TONE_MAP, regenerate_section, run_generation
+from viewer import paginate as paginate_text, view_section
 
 # ========== INITIALIZATION ==========
 st.set_page_config(
@@ -30,10 +27,6 @@ st.set_page_config(
 
 # ========== CONSTANTS ==========
 LOGO_URL = "https://raw.githubusercontent.com/Prosocr3ature/NarrativaX/main/logo.png"
-MAX_TOKENS = 1800
-IMAGE_SIZE = (768, 1024)
-PROGRESS_QUEUE = queue.Queue()
-TIMEOUT = 300  # 5 minutes
 
 SAFE_LOADING_MESSAGES = [
     "Sharpening quills...", "Mixing metaphorical ink...",
@@ -44,21 +37,6 @@ SAFE_LOADING_MESSAGES = [
     "Subverting expectations..."
 ]
 
-TONE_MAP = {
-    "Romantic": "sensual, romantic, literary",
-    "Dark Romantic": "moody, passionate, emotional",
-    "NSFW": "detailed erotic, emotional, mature",
-    "Hardcore": "intense, vulgar, graphic, pornographic",
-    "BDSM": "dominant, submissive, explicit, power-play",
-    "Playful": "flirty, teasing, lighthearted",
-    "Mystical": "dreamlike, surreal, poetic",
-    "Gritty": "raw, realistic, street-style",
-    "Slow Burn": "subtle, growing tension, emotional depth",
-    "Wholesome": "uplifting, warm, feel-good",
-    "Suspenseful": "tense, thrilling, page-turning",
-    "Philosophical": "deep, reflective, thoughtful"
-}
-
 GENRES = [
     "Adventure", "Fantasy", "Dark Fantasy", "Romance", "Thriller",
     "Mystery", "Drama", "Sci-Fi", "Slice of Life", "Horror", "Crime",
@@ -69,154 +47,16 @@ GENRES = [
     "Dubious Consent", "Voyeurism", "Yaoi", "Yuri", "Taboo Fantasy"
 ]
 
-IMAGE_MODELS = {
-    "Realistic Vision v5.1": "lucataco/realistic-vision-v5.1:2c8e954decbf70b7607a4414e5785ef9e4de4b8c51d50fb8b8b349160e0ef6bb",
-    "Reliberate V3 (NSFW)": "asiryan/reliberate-v3:d70438fcb9bb7adb8d6e59cf236f754be0b77625e984b8595d1af02cdf034b29"
-}
-
 # ========== SESSION STATE ==========
-for key in ['book', 'outline', 'cover', 'characters', 'gen_progress']:
+for key in ['book', 'outline', 'cover', 'characters', 'job_id', 'journal_id', 'last_progress', 'last_error', 'last_job_stats', 'last_timings', 'book_config', 'last_regeneration']:
     st.session_state.setdefault(key, None)
 st.session_state.setdefault('image_cache', {})
+st.session_state.setdefault('session_id', uuid.uuid4().hex)
+st.session_state.setdefault('project_id', uuid.uuid4().hex[:16])
 
-# ========== CORE FUNCTIONS ==========
-def pil_to_base64(image: Image.Image) -> str:
-    buffered = BytesIO()
-    image.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode("utf-8")
-
-def base64_to_pil(b64_str: str) -> Image.Image:
-    return Image.open(BytesIO(base64.b64decode(b64_str)))
-
-def call_openrouter(prompt: str, model: str) -> str:
-    headers = {"Authorization": f"Bearer {os.getenv('OPENROUTER_API_KEY')}"}
-    payload = {
-        "model": model,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.95,
-        "max_tokens": MAX_TOKENS
-    }
-    try:
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"].strip()
-    except Exception as e:
-        PROGRESS_QUEUE.put(("ERROR", f"API Error: {str(e)}", 0, ""))
-        raise
-
-def generate_image(prompt: str, model_key: str, id_key: str) -> Image.Image:
-    try:
-        if id_key in st.session_state.image_cache:
-            cached = st.session_state.image_cache[id_key]
-            return base64_to_pil(cached) if isinstance(cached, str) else cached
-
-        output = replicate.run(
-            IMAGE_MODELS[model_key],
-            input={
-                "prompt": f"{escape(prompt[:250])} {random.choice(['intricate details', 'cinematic lighting', '8k resolution'])}",
-                "negative_prompt": "text, watermark, deformed, blurry",
-                "num_inference_steps": 35,
-                "width": IMAGE_SIZE[0],
-                "height": IMAGE_SIZE[1]
-            }
-        )
-
-        if output and isinstance(output, list):
-            response = requests.get(output[0], timeout=30)
-            response.raise_for_status()
-            image = Image.open(BytesIO(response.content)).convert("RGB")
-            st.session_state.image_cache[id_key] = pil_to_base64(image)
-            return image
-    except Exception as e:
-        PROGRESS_QUEUE.put(("ERROR", f"Image Error: {str(e)}", 0, ""))
-    return None
-
-def background_generation_task():
-    try:
-        config = st.session_state.gen_progress
-        total_steps = 4 + (config['chapters'] * 3)
-        current_step = 0
-
-        def heartbeat():
-            while st.session_state.gen_progress:
-                PROGRESS_QUEUE.put(("💓", "Processing...", current_step/total_steps, ""))
-                time.sleep(10)
-
-        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
-        add_script_run_ctx(heartbeat_thread)
-        heartbeat_thread.start()
-
-        # Phase 1: Concept Development
-        PROGRESS_QUEUE.put(("🌌", "Developing core concept...", current_step/total_steps, ""))
-        premise = call_openrouter(
-            f"Develop a {config['genre']} story premise: {escape(config['prompt'])}",
-            config['model']
-        )
-        current_step += 1
-
-        # Phase 2: Outline Generation
-        PROGRESS_QUEUE.put(("📜", "Crafting detailed outline...", current_step/total_steps, ""))
-        outline_prompt = f"""Create detailed outline for {TONE_MAP[config['tone']]} {config['genre']} novel: {premise}
-        Include chapter breakdowns, character arcs, and key plot points."""
-        st.session_state.outline = call_openrouter(outline_prompt, config['model'])
-        current_step += 1
-
-        # Phase 3: Content Generation
-        book = {}
-        sections = ["Foreword"] + [f"Chapter {i+1}" for i in range(config['chapters'])] + ["Epilogue"]
-        
-        for sec in sections:
-            PROGRESS_QUEUE.put(("📖", f"Writing {sec}...", current_step/total_steps, ""))
-            content = call_openrouter(
-                f"Write immersive '{sec}' content for {config['genre']} novel: {st.session_state.outline}",
-                config['model']
-            )
-            book[sec] = content
-            current_step += 1
-
-            PROGRESS_QUEUE.put(("🎨", f"Generating {sec} image...", current_step/total_steps, ""))
-            generate_image(f"{escape(content[:200])} {TONE_MAP[config['tone']]} style", config['img_model'], sec)
-            current_step += 1
-
-        # Phase 4: Final Assets
-        PROGRESS_QUEUE.put(("🖼️", "Creating cover art...", current_step/total_steps, ""))
-        st.session_state.cover = generate_image(
-            f"Cinematic cover art for {config['genre']} novel: {premise}",
-            config['img_model'],
-            "cover"
-        )
-        current_step += 1
-
-        PROGRESS_QUEUE.put(("👥", "Developing characters...", current_step/total_steps, ""))
-        st.session_state.characters = json.loads(call_openrouter(
-            f"""Generate characters for {config['genre']} novel in JSON format:
-            {st.session_state.outline}
-            Format: [{{"name":"","role":"","personality":"","appearance":""}}]""",
-            config['model']
-        ))
-        current_step += 1
-
-        st.session_state.book = book
-        PROGRESS_QUEUE.put(("COMPLETE", "📖 Book generation complete!", 1.0, ""))
-
-    except Exception as e:
-        PROGRESS_QUEUE.put(("ERROR", f"Generation failed: {str(e)}", 0, ""))
-        st.session_state.gen_progress = None
-
-def background_generation_wrapper():
-    try:
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(background_generation_task)
-            future.result(timeout=TIMEOUT)
-    except TimeoutError:
-        PROGRESS_QUEUE.put(("ERROR", "Generation timed out after 5 minutes", 0, ""))
-    finally:
-        st.session_state.gen_progress = None
+logging.basicConfig(level=os.getenv("NARRATIVAX_LOG_LEVEL", "INFO"))
+# Prometheus text at /metrics and JSON at /metrics.json when NARRATIVAX_METRICS_PORT is set
+start_metrics_server()
 
 # ========== UI COMPONENTS ==========
 def dramatic_logo():
@@ -280,53 +120,113 @@ def dramatic_logo():
     </div>
     """, unsafe_allow_html=True)
 
-def progress_animation():
+def apply_generation_result(result: dict):
+    st.session_state.book = result["book"]
+    st.session_state.outline = result["outline"]
+    st.session_state.cover = result["cover"]
+    st.session_state.characters = result["characters"]
+    st.session_state.image_cache = result["image_cache"]
+    st.session_state.last_timings = result.get("timings")
+    st.session_state.book_config = result.get("config")
+    st.session_state.last_regeneration = result if "regenerated" in result else None
+
+def render_timings(timings: dict):
+    rows = [{
+        "Step": kind,
+        "Calls": row["count"],
+        "Total (s)": row["seconds"],
+        "Slowest (s)": row["max"],
+        "Prompt tokens": row["prompt_tokens"],
+        "Completion tokens": row["completion_tokens"],
+        "KB": round(row["bytes"] / 1024),
+        "Retries": row["retries"],
+        "Cache hits": row["cache_hits"],
+        "Hedges": row["hedges"],
+    } for kind, row in sorted(timings["kinds"].items(), key=lambda item: -item[1]["seconds"])]
+    st.caption(f"Wall time {timings['wall_seconds']:.1f}s; step totals overlap because steps run in parallel")
+    st.table(rows)
+    for model, stats in get_latency_tracker().snapshot().items():
+        if stats["samples"]:
+            st.caption(f"{model}: first token p50 {stats['p50']:.1f}s / p95 {stats['p95']:.1f}s, "
+                       f"hedged {stats['hedges']} of {stats['calls']} calls ({stats['hedge_wins']} won), "
+                       f"{stats['fallbacks']} fallbacks")
+
+def render_progress(container, status: tuple):
+    emoji, message, progress, preview = status
+    safe_preview = "..." + escape(str(preview))[-PREVIEW_CHARS:] if preview else ""
+    container.markdown(f"""
+    <div style="text-align: center; padding: 2rem">
+        <div style="font-size: 3rem; animation: pulse 1.5s infinite">{emoji}</div>
+        <h3 style="margin: 1rem 0">{escape(message)}</h3>
+        <progress class="progress-bar" value="{progress}" max="1"></progress>
+        {f'<div style="background: rgba(255,255,255,0.1); border-radius: 10px; padding: 1rem; margin: 1rem 0">{safe_preview}</div>' if preview else ''}
+    </div>
+    """, unsafe_allow_html=True)
+
+def progress_animation(job: Job):
+    # Blocks this script run on the job's channel and redraws one placeholder per burst of
+    # events, instead of re-executing the whole script on a timer
     try:
-        if not PROGRESS_QUEUE.empty():
-            status = PROGRESS_QUEUE.get()
-            
-            with st.empty() as container:
-                while True:
-                    if status[0] == "COMPLETE":
-                        st.balloons()
-                        st.session_state.gen_progress = None
-                        break
-                    elif status[0] == "ERROR":
-                        st.error(f"🚨 {escape(str(status[1]))[:200]}...")
-                        st.session_state.gen_progress = None
-                        break
-                    else:
-                        emoji, message, progress, preview = status
-                        safe_preview = escape(str(preview))[:150] + "..." if preview else ""
-                        container.markdown(f"""
-                        <div style="text-align: center; padding: 2rem">
-                            <div style="font-size: 3rem; animation: pulse 1.5s infinite">{emoji}</div>
-                            <h3 style="margin: 1rem 0">{escape(message)}</h3>
-                            <progress class="progress-bar" value="{progress}" max="1"></progress>
-                            {f'<div style="background: rgba(255,255,255,0.1); border-radius: 10px; padding: 1rem; margin: 1rem 0">{safe_preview}</div>' if preview else ''}
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    try:
-                        status = PROGRESS_QUEUE.get(timeout=0.1)
-                    except queue.Empty:
-                        break
+        job.ui_stats["reruns"] += 1
+        # The click reruns the script, which stops this run at its next redraw; the callback then cancels
+        st.button("✖️ Cancel", on_click=get_job_manager().cancel, args=(job.id,), key=f"cancel:{job.id}")
+        container = st.empty()
+        if st.session_state.last_progress:
+            render_progress(container, st.session_state.last_progress)
+
+        for status in job.follow():
+            started = time.thread_time()
+            if status[0] == "COMPLETE":
+                apply_generation_result(job.result)
+                st.session_state.last_job_stats = dict(job.ui_stats)
+                st.balloons()
+            elif status[0] == "ERROR":
+                st.session_state.last_error = str(status[1])
+            else:
+                render_progress(container, status)
+                st.session_state.last_progress = status
+                job.ui_stats["renders"] += 1
+                job.ui_stats["cpu_seconds"] += time.thread_time() - started
+
+        st.session_state.job_id = None
+        st.session_state.last_progress = None
     except Exception as e:
-        st.error(f"Animation Error: {escape(str(e))[:200]}...")
-        st.session_state.gen_progress = None
+        st.session_state.last_error = f"Animation Error: {e}"
+        st.session_state.job_id = None
+
+def start_generation(config: dict, run=run_generation):
+    try:
+        job = get_job_manager().submit(st.session_state.session_id, run, config)
+    except JobRejected as e:
+        st.warning(f"⏳ {escape(str(e))}")
+        return
+    st.session_state.job_id = job.id
+    st.experimental_rerun()
 
 def main_interface():
     try:
-        if st.session_state.get('gen_progress'):
+        job = get_job_manager().get(st.session_state.job_id)
+        if st.session_state.job_id and job is None:
+            # The job outlived its retention window or the process restarted
+            st.session_state.job_id = None
+        if job:
             dramatic_logo()
-            progress_animation()
-            
-            time.sleep(0.1)
+            progress_animation(job)
+            # One rerun per finished job, to swap the overlay for the book
             st.experimental_rerun()
         else:
             st.markdown(f'<img src="{escape(LOGO_URL)}" width="300" style="float:right; margin:-50px -20px 0 0">', 
                       unsafe_allow_html=True)
             st.title("NarrativaX — Immersive AI Book Creator")
+            if st.session_state.last_error:
+                st.error(f"🚨 {escape(st.session_state.last_error)[:200]}...")
+                st.session_state.last_error = None
+            if st.session_state.last_job_stats:
+                stats = st.session_state.last_job_stats
+                st.caption(
+                    f"Progress view: {stats['reruns']} reruns, {stats['renders']} redraws, "
+                    f"{stats['cpu_seconds'] * 1000:.0f} ms server CPU"
+                )
             
             with st.container():
                 prompt = st.text_area("🖋️ Your Story Concept", height=120,
@@ -335,28 +235,33 @@ def main_interface():
                 genre = col1.selectbox("📖 Genre", GENRES)
                 tone = col2.selectbox("🎨 Tone", list(TONE_MAP))
                 chapters = col3.slider("📚 Chapters", 4, 30, 10)
-                model = col1.selectbox("🤖 AI Model", ["nothingiisreal/mn-celeste-12b", "gryphe/mythomax-l2-13b"])
+                model = col1.selectbox("🤖 AI Model", TEXT_MODELS)
                 img_model = col2.selectbox("🖼️ Image Model", list(IMAGE_MODELS))
 
+                journal = Journal(st.session_state.journal_id) if st.session_state.journal_id else None
                 if st.button("🚀 Create Book"):
                     st.session_state.image_cache.clear()
                     st.session_state.cover = None
                     st.session_state.book = None
                     st.session_state.outline = None
                     st.session_state.characters = None
+                    st.session_state.last_regeneration = None
                     
-                    st.session_state.gen_progress = {
+                    st.session_state.journal_id = uuid.uuid4().hex
+                    # Kept with the project too, so loading it after a refresh can still resume the book
+                    open_project(st.session_state.project_id).set_journal(st.session_state.journal_id)
+                    start_generation({
                         "prompt": prompt, "genre": genre, "tone": tone,
-                        "chapters": chapters, "model": model, "img_model": img_model
-                    }
-                    gen_thread = threading.Thread(target=background_generation_wrapper, daemon=True)
-                    add_script_run_ctx(gen_thread)
-                    gen_thread.start()
-                    st.rerun()
+                        "chapters": chapters, "model": model, "img_model": img_model,
+                        "journal_id": st.session_state.journal_id
+                    })
+                elif journal and journal.resumable() and st.button("♻️ Resume Last Book"):
+                    config, _, _ = journal.load()
+                    start_generation({**config, "journal_id": journal.job_id})
                     
     except Exception as e:
         st.error(f"Application Error: {escape(str(e))[:200]}...")
-        st.session_state.gen_progress = None
+        st.session_state.job_id = None
         st.stop()
 
 def render_sidebar():
@@ -364,35 +269,47 @@ def render_sidebar():
         with st.sidebar:
             st.markdown(f'<img src="{escape(LOGO_URL)}" width="200" style="margin-bottom:20px">', unsafe_allow_html=True)
             
+            # Each session saves to its own project; entering another ID loads that project instead
+            project_id = st.text_input("🔑 Project ID", st.session_state.project_id).strip().lower()
+
             if st.button("💾 Save Project"):
                 try:
-                    save_data = {
-                        'book': st.session_state.book,
-                        'outline': st.session_state.outline,
-                        'characters': st.session_state.characters,
-                        'image_cache': st.session_state.image_cache,
-                        'cover': pil_to_base64(st.session_state.cover) if st.session_state.cover else None
-                    }
-                    with open("session.narrx", "w") as f:
-                        json.dump(save_data, f)
-                    st.success("Project saved!")
+                    written = open_project(project_id).save(
+                        st.session_state.book or {},
+                        st.session_state.outline,
+                        st.session_state.characters,
+                        st.session_state.image_cache,
+                        st.session_state.cover,
+                        st.session_state.book_config
+                    )
+                    st.session_state.project_id = project_id
+                    st.success(f"Project saved! ({written['sections']} sections, {written['images']} images updated)")
                 except Exception as e:
                     st.error(f"Save failed: {escape(str(e))[:200]}...")
 
             if st.button("📂 Load Project"):
                 try:
-                    with open("session.narrx", "r") as f:
-                        data = json.load(f)
-                    
-                    st.session_state.book = data.get('book')
-                    st.session_state.outline = data.get('outline')
-                    st.session_state.characters = data.get('characters')
-                    st.session_state.image_cache = {
-                        k: base64_to_pil(v) if isinstance(v, str) else v 
-                        for k, v in data.get('image_cache', {}).items()
-                    }
-                    if data.get('cover'):
-                        st.session_state.cover = base64_to_pil(data['cover'])
+                    if import_legacy(project_id):
+                        st.info(f"Imported the old {LEGACY_PATH} save as project {project_id}")
+                    project = open_project(project_id, readonly=True)
+                    data = project.open_book()
+                    if data['journal_id']:
+                        st.session_state.journal_id = data['journal_id']
+                    if not project.exists():
+                        if data['journal_id'] and Journal(data['journal_id']).resumable():
+                            # Nothing saved yet, but its book can still be finished: rerun to offer Resume
+                            st.session_state.project_id = project_id
+                            st.experimental_rerun()
+                        raise FileNotFoundError(f"No saved project {project_id}")
+                    st.session_state.book = data['book']
+                    st.session_state.outline = data['outline']
+                    st.session_state.characters = data['characters']
+                    st.session_state.image_cache = data['image_cache']
+                    st.session_state.cover = data['cover']
+                    st.session_state.book_config = data['config']
+                    st.session_state.last_timings = None
+                    st.session_state.last_regeneration = None
+                    st.session_state.project_id = project_id
                     st.success("Project loaded!")
                 except Exception as e:
                     st.error(f"Load failed: {escape(str(e))[:200]}...")
@@ -400,58 +317,93 @@ def render_sidebar():
             if st.session_state.book and st.button("📦 Export Book"):
                 with st.spinner("Packaging your masterpiece..."):
                     try:
-                        with NamedTemporaryFile(delete=False, suffix=".zip") as tmp:
-                            with zipfile.ZipFile(tmp.name, 'w') as zipf:
-                                # DOCX
-                                doc = Document()
-                                for sec, content in st.session_state.book.items():
-                                    doc.add_heading(sec, level=1)
-                                    doc.add_paragraph(content)
-                                    if sec in st.session_state.image_cache:
-                                        img = st.session_state.image_cache[sec]
-                                        if isinstance(img, str):
-                                            img = base64_to_pil(img)
-                                        img_io = BytesIO()
-                                        img.save(img_io, format='PNG')
-                                        doc.add_picture(img_io, width=Inches(5))
-                                doc.save("book.docx")
-                                zipf.write("book.docx")
-                                os.remove("book.docx")
-
-                                # PDF
-                                pdf = FPDF()
-                                pdf.set_auto_page_break(auto=True, margin=15)
-                                if st.session_state.cover:
-                                    cover_path = "cover.png"
-                                    st.session_state.cover.save(cover_path)
-                                    pdf.image(cover_path, x=0, y=0, w=pdf.w, h=pdf.h)
-                                    pdf.add_page()
-                                pdf.set_font("Arial", size=12)
-                                for sec, content in st.session_state.book.items():
-                                    pdf.set_font("Arial", 'B', 16)
-                                    pdf.cell(0, 10, sec, ln=True)
-                                    pdf.set_font("Arial", size=12)
-                                    pdf.multi_cell(0, 10, content)
-                                pdf.output("book.pdf")
-                                zipf.write("book.pdf")
-                                os.remove("book.pdf")
-
-                                # Audio
-                                for i, (sec, content) in enumerate(st.session_state.book.items()):
-                                    with NamedTemporaryFile(delete=False, suffix=".mp3") as audio_tmp:
-                                        tts = gTTS(text=content, lang='en')
-                                        tts.save(audio_tmp.name)
-                                        zipf.write(audio_tmp.name, f"chapter_{i+1}.mp3")
-                                        os.remove(audio_tmp.name)
-
-                            with open(tmp.name, "rb") as f:
-                                st.download_button("⬇️ Download ZIP", f.read(), "narrativax_book.zip")
-                            os.remove(tmp.name)
+                        zip_path, timings = get_exporter().export(
+                            st.session_state.book, st.session_state.image_cache, st.session_state.cover
+                        )
+                        # Streamlit 1.16 reads the archive into the session; the exporter caps what stays on disk
+                        with open(zip_path, "rb") as f:
+                            st.download_button("⬇️ Download ZIP", f, "narrativax_book.zip")
+                        st.caption(" · ".join(
+                            f"{fmt}: {t['seconds']:.1f}s{' (cached)' if t['cached'] else ''}"
+                            for fmt, t in timings.items()
+                        ))
                     except Exception as e:
                         st.error(f"Export failed: {escape(str(e))[:200]}...")
+
+            cache = get_completion_cache()
+            if cache:
+                stats = cache.snapshot()
+                st.caption(
+                    f"🧠 LLM cache: {stats['hits']} hits / {stats['misses']} misses "
+                    f"({stats['hit_rate']:.0%}), ~{stats['saved_seconds']:.0f}s and "
+                    f"{stats['saved_chars']:,} chars of completions saved"
+                )
     except Exception as e:
         st.error(f"Sidebar Error: {escape(str(e))[:200]}...")
 
+@st.experimental_memo(max_entries=256, show_spinner=False)
+def paginate(digest: str, _content: str) -> list:
+    # Keyed by the content digest alone; the leading underscore keeps the text itself out of the hash
+    return paginate_text(_content)
+
+def move_section(sections: list, step: int):
+    index = sections.index(st.session_state.viewer_section) + step
+    st.session_state.viewer_section = sections[max(0, min(index, len(sections) - 1))]
+
+def start_regeneration(section: str, redraw_image: bool):
+    start_generation({
+        **st.session_state.book_config,
+        "book": st.session_state.book,
+        "outline": st.session_state.outline,
+        "characters": st.session_state.characters,
+        "image_cache": st.session_state.image_cache,
+        "cover": st.session_state.cover,
+        "section": section,
+        "redraw_image": redraw_image,
+    }, regenerate_section)
+
+def render_viewer(book):
+    # Only the selected section is read, paginated and drawn; the rest are just names in the contents
+    sections = list(book)
+    if st.session_state.get("viewer_section") not in sections:
+        st.session_state.viewer_section = sections[0]
+
+    toc, page = st.columns([1, 3])
+    toc.radio("📚 Contents", sections, key="viewer_section")
+    section = st.session_state.viewer_section
+    index = sections.index(section)
+    digest = hashlib.sha256(book[section].encode("utf-8")).hexdigest()
+    view = view_section(book, section, st.session_state.image_cache, pages=lambda content: paginate(digest, content))
+    pages = view.pages
+
+    with page:
+        st.subheader(f"📜 {section}")
+        number = 1
+        if len(pages) > 1:
+            number = st.select_slider("Page", options=list(range(1, len(pages) + 1)), key=f"page:{digest[:16]}")
+        text, art = st.columns([3, 2])
+        with text:
+            st.markdown(pages[number - 1])
+            if view.audio_path:
+                st.audio(view.audio_path, format="audio/mp3")
+            else:
+                st.caption("🎧 Narration is rendering...")
+        with art:
+            if view.thumbnail is not None:
+                st.image(view.thumbnail, use_container_width=True)
+            else:
+                st.warning("No image for this section")
+            with st.expander("🔁 Regenerate this section"):
+                if st.session_state.book_config:
+                    redraw = st.checkbox("Also redraw its image", key="redraw_image")
+                    if st.button("🔁 Rewrite section"):
+                        start_regeneration(section, redraw)
+                else:
+                    st.caption("This project was saved without its generation settings")
+        back, forward = st.columns(2)
+        back.button("⬅️ Previous", on_click=move_section, args=(sections, -1), disabled=index == 0)
+        forward.button("Next ➡️", on_click=move_section, args=(sections, 1), disabled=index == len(sections) - 1)
+
 def display_content():
     try:
         if st.session_state.book:
@@ -459,10 +411,20 @@ def display_content():
             
             with st.expander("📔 Book Cover", expanded=True):
                 if st.session_state.cover:
-                    st.image(st.session_state.cover, use_container_width=True)
+                    st.image(get_image_store().read(st.session_state.cover), use_container_width=True)
                 else:
                     st.warning("No cover generated yet")
             
+            if st.session_state.last_regeneration:
+                regeneration = st.session_state.last_regeneration
+                st.info(f"♻️ Rewrote {', '.join(regeneration['regenerated'])}"
+                        f"{' and kept ' + ', '.join(regeneration['kept']) if regeneration['kept'] else ''}; "
+                        f"{len(regeneration['stale'])} derived artifacts rebuild on next use, everything else is cached")
+
+            if st.session_state.last_timings:
+                with st.expander("⏱️ Generation Timing"):
+                    render_timings(st.session_state.last_timings)
+
             with st.expander("📝 Full Outline"):
                 st.markdown(f"```\n{escape(st.session_state.outline)}\n```")
             
@@ -477,23 +439,7 @@ def display_content():
                         **Appearance:** {escape(char.get('appearance', 'Not specified'))}
                         """)
 
-            for section, content in st.session_state.book.items():
-                with st.expander(f"📜 {escape(section)}"):
-                    col1, col2 = st.columns([3, 2])
-                    with col1:
-                        st.write(escape(content))
-                        with NamedTemporaryFile(suffix=".mp3") as tf:
-                            tts = gTTS(text=content, lang='en')
-                            tts.save(tf.name)
-                            st.audio(tf.name, format="audio/mp3")
-                    with col2:
-                        if section in st.session_state.image_cache:
-                            img = st.session_state.image_cache[section]
-                            if isinstance(img, str):
-                                img = base64_to_pil(img)
-                            st.image(img, use_container_width=True)
-                        else:
-                            st.warning("No image for this section")
+            render_viewer(st.session_state.book)
     except Exception as e:
         st.error(f"Content Error: {escape(str(e))[:200]}...")
 
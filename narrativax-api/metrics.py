@@ -0,0 +1,271 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+COUNTERS = ("prompt_tokens", "completion_tokens", "bytes", "retries", "cache_hits", "hedges")
+METRICS_PORT = int(os.getenv("NARRATIVAX_METRICS_PORT", "0"))
+
+logger = logging.getLogger("narrativax.metrics")
+
+
+class Span:
+    """One timed unit of work (a step, a provider call, an export) with its counters."""
+
+    def __init__(self, kind: str, name: str = "", provider: Optional[str] = None):
+        self.kind = kind
+        self.name = name
+        self.provider = provider
+        self.started = time.monotonic()
+        self.seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.recorder: Optional["Recorder"] = None
+        self.deferred = False
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        # Helper threads attached to this span may add concurrently
+        with self._lock:
+            for key, value in counts.items():
+                self.counts[key] += value or 0
+
+    def defer(self):
+        self.deferred = True
+
+    def finish(self, error: Optional[str] = None):
+        self.seconds = time.monotonic() - self.started
+        self.error = error or self.error
+        _metrics.observe(self)
+        if self.recorder:
+            self.recorder.end(self)
+        logger.info("span %s", json.dumps(self.as_dict()))
+
+    @property
+    def elapsed(self) -> float:
+        return self.seconds if self.seconds is not None else time.monotonic() - self.started
+
+    def as_dict(self) -> dict:
+        return {"kind": self.kind, "name": self.name, "provider": self.provider,
+                "seconds": round(self.elapsed, 3), "error": self.error, **self.counts}
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation; coarse but cheap
+        target, seen = q * self.count, 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target and count:
+                return bound
+        return 0.0
+
+
+class Metrics:
+    """Process-wide aggregation of finished spans, keyed by (kind, provider)."""
+
+    def __init__(self):
+        self.latency: Dict[tuple, Histogram] = {}
+        self.totals: Dict[tuple, Dict[str, int]] = {}
+        self.errors: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, span: Span):
+        key = (span.kind, span.provider or "")
+        with self._lock:
+            self.latency.setdefault(key, Histogram()).observe(span.seconds)
+            totals = self.totals.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            for counter, value in span.counts.items():
+                totals[counter] += value
+            if span.error:
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            return [{
+                "kind": kind, "provider": provider,
+                "count": hist.count, "seconds": round(hist.sum, 3),
+                "p50": hist.quantile(0.5), "p95": hist.quantile(0.95),
+                "errors": self.errors.get((kind, provider), 0),
+                **self.totals[(kind, provider)],
+            } for (kind, provider), hist in sorted(self.latency.items())]
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP narrativax_span_seconds Latency of pipeline steps and provider calls.",
+            "# TYPE narrativax_span_seconds histogram",
+        ]
+        with self._lock:
+            for (kind, provider), hist in sorted(self.latency.items()):
+                labels = f'kind="{kind}",provider="{provider}"'
+                cumulative = 0
+                for bound, count in zip(hist.buckets + ("+Inf",), hist.counts):
+                    cumulative += count
+                    lines.append(f'narrativax_span_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"narrativax_span_seconds_sum{{{labels}}} {hist.sum:.6f}")
+                lines.append(f"narrativax_span_seconds_count{{{labels}}} {hist.count}")
+            for counter in COUNTERS + ("errors",):
+                lines.append(f"# TYPE narrativax_{counter}_total counter")
+                for (kind, provider), totals in sorted(self.totals.items()):
+                    value = self.errors.get((kind, provider), 0) if counter == "errors" else totals[counter]
+                    lines.append(f'narrativax_{counter}_total{{kind="{kind}",provider="{provider}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+class Recorder:
+    """Per-job span log: what is running now, and a breakdown once it's done."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self.active: List[Span] = []
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def begin(self, span: Span):
+        with self._lock:
+            self.active.append(span)
+
+    def end(self, span: Span):
+        with self._lock:
+            self.active.remove(span)
+            self.spans.append(span)
+
+    def running(self) -> List[Span]:
+        with self._lock:
+            return sorted(self.active, key=lambda s: s.started)
+
+    def breakdown(self) -> dict:
+        """Totals per span kind plus the job's wall time."""
+        kinds: Dict[str, dict] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            row = kinds.setdefault(span.kind, {"count": 0, "seconds": 0.0, "max": 0.0, "errors": 0,
+                                               **dict.fromkeys(COUNTERS, 0)})
+            row["count"] += 1
+            row["seconds"] += span.seconds
+            row["max"] = max(row["max"], span.seconds)
+            row["errors"] += bool(span.error)
+            for counter, value in span.counts.items():
+                row[counter] += value
+        for row in kinds.values():
+            row["seconds"], row["max"] = round(row["seconds"], 3), round(row["max"], 3)
+        return {"wall_seconds": round(time.monotonic() - self.started, 3), "kinds": kinds}
+
+
+_metrics = Metrics()
+_local = threading.local()
+
+
+def get_metrics() -> Metrics:
+    return _metrics
+
+
+def current() -> Optional[Span]:
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+
+def annotate(**counts):
+    """Add counters to the innermost open span on this thread; a no-op outside one."""
+    span = current()
+    if span is not None:
+        span.add(**counts)
+
+
+@contextmanager
+def attach(parent: Optional[Span]) -> Iterator[Optional[Span]]:
+    """Make ``parent`` the current span on this thread, so helper threads annotate their caller's span."""
+    stack = _local.__dict__.setdefault("stack", [])
+    recorders = _local.__dict__.setdefault("recorders", [])
+    if parent is None:
+        yield None
+        return
+    stack.append(parent)
+    recorders.append(parent.recorder)
+    try:
+        yield parent
+    finally:
+        stack.pop()
+        recorders.pop()
+
+
+@contextmanager
+def span(kind: str, name: str = "", provider: Optional[str] = None,
+         recorder: Optional[Recorder] = None) -> Iterator[Span]:
+    """Time a block. Nested spans inherit the enclosing span's recorder.
+
+    Work that outlives the block (an asynchronous step) calls ``defer()`` on
+    the span and ``finish()`` once it really ends.
+    """
+    stack = _local.__dict__.setdefault("stack", [])
+    recorders = _local.__dict__.setdefault("recorders", [])
+    recorder = recorder or (recorders[-1] if recorders else None)
+    current_span = Span(kind, name, provider)
+    current_span.recorder = recorder
+    stack.append(current_span)
+    recorders.append(recorder)
+    if recorder:
+        recorder.begin(current_span)
+    try:
+        yield current_span
+    except BaseException as e:
+        current_span.error = type(e).__name__
+        raise
+    finally:
+        stack.pop()
+        recorders.pop()
+        if not current_span.deferred:
+            current_span.finish()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """Serve ``/metrics`` (Prometheus text) and ``/metrics.json`` once per process; 0 disables it."""
+    global _server
+    with _server_lock:
+        if _server is None and port:
+            # Imported here so processes that never serve metrics don't pay for http.server
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+            class _MetricsHandler(BaseHTTPRequestHandler):
+                def log_message(self, *args):
+                    pass
+
+                def do_GET(self):
+                    if self.path.startswith("/metrics.json"):
+                        body, content_type = json.dumps(get_metrics().snapshot()).encode(), "application/json"
+                    elif self.path.startswith("/metrics"):
+                        body, content_type = get_metrics().prometheus().encode(), "text/plain; version=0.0.4"
+                    else:
+                        self.send_error(404)
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True, name="metrics").start()
+        return _server
@@ -0,0 +1,501 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from functools import partial
+from html import escape
+from typing import Callable, Dict, Iterator, List
+
+from completion_cache import completion_key, get_completion_cache
+from context import ContextBuilder, estimate_tokens, memory_sources
+from dependencies import book_dependencies
+from export import FORMATS
+from hedging import hedged_stream
+from image_store import ImageHandle
+from jobs import Job
+from journal import Journal
+from metrics import Recorder, annotate, span
+from plugins import IMAGE_BACKENDS
+from ratelimit import throttle
+from scheduler import TaskGraph
+from transport import CONNECT_TIMEOUT, get_transport
+from tts import get_audio_library
+
+# ========== CONSTANTS ==========
+OPENROUTER_URL = os.getenv("NARRATIVAX_OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+MAX_TOKENS = 1800
+TEMPERATURE = 0.95
+# Deterministic mode sends a fixed seed so a cached completion is the one the API would return anyway
+SEED = int(os.environ["NARRATIVAX_SEED"]) if os.getenv("NARRATIVAX_SEED") else None
+IMAGE_SIZE = (768, 1024)
+# Finished steps are journaled, so a timeout only pauses the book; 0 disables it
+TIMEOUT = int(os.getenv("NARRATIVAX_TIMEOUT", "1800")) or None
+MAX_WORKERS = int(os.getenv("NARRATIVAX_MAX_WORKERS", "8"))
+PROVIDER_LIMITS = {
+    "openrouter": int(os.getenv("NARRATIVAX_OPENROUTER_CONCURRENCY", "4")),
+}
+TEXT_MODELS = ["nothingiisreal/mn-celeste-12b", "gryphe/mythomax-l2-13b"]
+# Where a late or failed call is duplicated: "alternate" tries the next text model, "same" the model itself
+HEDGE_TARGET = os.getenv("NARRATIVAX_HEDGE_TARGET", "alternate")
+# Explicit "model=fallback" pairs, comma-separated, override HEDGE_TARGET
+FALLBACK_MODELS = dict(
+    item.strip().split("=", 1) for item in os.getenv("NARRATIVAX_FALLBACK_MODELS", "").split(",") if "=" in item
+)
+IMAGE_BACKEND = os.getenv("NARRATIVAX_IMAGE_BACKEND", "replicate")
+STREAM_PREVIEWS = os.getenv("NARRATIVAX_STREAM", "1") == "1"
+PREVIEW_INTERVAL = 0.5  # seconds between preview updates across all streams
+PREVIEW_CHARS = 150
+# "written" chains each chapter on the previous one so its memory is the actual text, at the cost of fan-out
+CONTEXT_MEMORY = os.getenv("NARRATIVAX_CONTEXT_MEMORY", "outline")
+
+TONE_MAP = {
+    "Romantic": "sensual, romantic, literary",
+    "Dark Romantic": "moody, passionate, emotional",
+    "NSFW": "detailed erotic, emotional, mature",
+    "Hardcore": "intense, vulgar, graphic, pornographic",
+    "BDSM": "dominant, submissive, explicit, power-play",
+    "Playful": "flirty, teasing, lighthearted",
+    "Mystical": "dreamlike, surreal, poetic",
+    "Gritty": "raw, realistic, street-style",
+    "Slow Burn": "subtle, growing tension, emotional depth",
+    "Wholesome": "uplifting, warm, feel-good",
+    "Suspenseful": "tense, thrilling, page-turning",
+    "Philosophical": "deep, reflective, thoughtful"
+}
+
+IMAGE_MODELS = {
+    "Realistic Vision v5.1": "lucataco/realistic-vision-v5.1:2c8e954decbf70b7607a4414e5785ef9e4de4b8c51d50fb8b8b349160e0ef6bb",
+    "Reliberate V3 (NSFW)": "asiryan/reliberate-v3:d70438fcb9bb7adb8d6e59cf236f754be0b77625e984b8595d1af02cdf034b29"
+}
+
+logger = logging.getLogger("narrativax")
+
+# ========== CORE FUNCTIONS ==========
+def post_openrouter(prompt: str, model: str, stream: bool = False, seed: int = SEED):
+    headers = {"Authorization": f"Bearer {os.getenv('OPENROUTER_API_KEY')}"}
+    payload = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": TEMPERATURE,
+        "max_tokens": MAX_TOKENS,
+        "stream": stream
+    }
+    if seed is not None:
+        payload["seed"] = seed
+    throttle("openrouter")
+    return get_transport().post(
+        OPENROUTER_URL,
+        headers=headers,
+        json=payload,
+        timeout=(CONNECT_TIMEOUT, 60),
+        stream=stream
+    )
+
+def stream_openrouter(prompt: str, model: str, on_response: Callable = None, seed: int = SEED) -> Iterator[str]:
+    with post_openrouter(prompt, model, stream=True, seed=seed) as response:
+        if on_response is not None:
+            on_response(response)
+        annotate(retries=response.retries)
+        response.raise_for_status()
+        # text/event-stream carries no charset, and requests would otherwise fall back to latin-1
+        response.encoding = "utf-8"
+        for line in response.iter_lines(decode_unicode=True):
+            # Blank keep-alives and ": comment" lines carry no data
+            annotate(bytes=len(line) + 1)
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+
+def call_openrouter(prompt: str, model: str, on_token: Callable[[str, list], None] = None, fresh: bool = False) -> str:
+    """``fresh`` bypasses the cache and the fixed seed, for rewrites of a prompt already answered."""
+    cache = get_completion_cache()
+    key = completion_key(model, prompt, TEMPERATURE, MAX_TOKENS, SEED)
+    cached = cache.get(key) if cache and not fresh else None
+    if cached is not None:
+        annotate(cache_hits=1, completion_tokens=estimate_tokens(cached))
+        if on_token is not None:
+            on_token(cached, [cached])
+        return cached
+
+    started = time.monotonic()
+    # Always streamed, so a late first token can be hedged before the whole completion is waited for
+    stream = stream_openrouter
+    if fresh and SEED is not None:
+        # The fixed seed would just reproduce the text being replaced
+        stream = partial(stream_openrouter, seed=random.randrange(2 ** 31))
+    content, answered = hedged_stream(prompt, model, stream, on_token, fallback_model(model))
+    content = content.strip()
+
+    annotate(prompt_tokens=estimate_tokens(prompt), completion_tokens=estimate_tokens(content))
+
+    if cache and not fresh:
+        # Keyed by the model that actually answered, so a fallback's output is never served as the primary's
+        if answered != model:
+            key = completion_key(answered, prompt, TEMPERATURE, MAX_TOKENS, SEED)
+        cache.put(key, content, time.monotonic() - started)
+    return content
+
+def fallback_model(model: str) -> str:
+    if model in FALLBACK_MODELS:
+        return FALLBACK_MODELS[model]
+    if HEDGE_TARGET == "same" or model not in TEXT_MODELS:
+        return model
+    return TEXT_MODELS[(TEXT_MODELS.index(model) + 1) % len(TEXT_MODELS)]
+
+def image_backend():
+    return IMAGE_BACKENDS.get(IMAGE_BACKEND)()
+
+def submit_image(prompt: str, model_key: str, id_key: str, cache: dict, group: str = None) -> Future:
+    """Start an illustration; the future resolves to its handle, or None if it failed."""
+    outcome = Future()
+    if id_key in cache:
+        annotate(cache_hits=1)
+        outcome.set_result(cache[id_key])
+        return outcome
+
+    prediction = image_backend().submit(
+        IMAGE_MODELS[model_key],
+        {
+            "prompt": f"{escape(prompt[:250])} {random.choice(['intricate details', 'cinematic lighting', '8k resolution'])}",
+            "negative_prompt": "text, watermark, deformed, blurry",
+            "num_inference_steps": 35,
+            "width": IMAGE_SIZE[0],
+            "height": IMAGE_SIZE[1]
+        },
+        group=group
+    )
+    outcome.counts = prediction.counts
+
+    def settle(done):
+        if done.cancelled():
+            outcome.cancel()
+        elif done.exception() is not None:
+            # A missing illustration shouldn't sink the book; the step reports it as a warning
+            logger.warning("Image generation failed for %s: %s", id_key, done.exception())
+            outcome.set_result(None)
+        else:
+            cache[id_key] = done.result()
+            outcome.set_result(done.result())
+    prediction.add_done_callback(settle)
+    # Cancelling the step cancels the prediction upstream
+    outcome.add_done_callback(lambda done: done.cancelled() and prediction.cancel())
+    return outcome
+
+def generate_image(prompt: str, model_key: str, id_key: str, cache: dict, group: str = None) -> ImageHandle:
+    return submit_image(prompt, model_key, id_key, cache, group).result()
+
+def book_sections(chapters: int) -> List[str]:
+    return ["Foreword"] + [f"Chapter {i+1}" for i in range(chapters)] + ["Epilogue"]
+
+def build_generation_graph(config: dict, image_cache: dict, preview=None, recorder: Recorder = None,
+                           sections: List[str] = None, written: Dict[str, str] = None) -> tuple:
+    """``written`` seeds the context memory with sections that already exist and won't be rerun."""
+    preview = preview or (lambda emoji, message: None)
+    sections = sections or book_sections(config['chapters'])
+    fresh = set(config.get('fresh', ()))
+    style = TONE_MAP[config['tone']]
+    group = config.get('journal_id')
+    graph = TaskGraph(limits=PROVIDER_LIMITS, max_workers=MAX_WORKERS)
+
+    def add(name, fn, deps=(), provider=None):
+        # Every step runs inside a span; the provider calls in it add their counters to it
+        kind, _, label = name.partition(":")
+
+        def traced(*args):
+            with span(kind, label, provider, recorder) as step:
+                result = fn(*args)
+                if isinstance(result, Future):
+                    # Asynchronous steps stay open until their future settles
+                    step.defer()
+                    result.add_done_callback(lambda done: finish_step(step, done))
+                return result
+        graph.add(name, traced, deps=deps, provider=provider)
+
+    def finish_step(step, done):
+        step.add(**getattr(done, "counts", {}))
+        step.finish("CancelledError" if done.cancelled() else None)
+
+    # Phase 1: Concept Development
+    add("premise", lambda: call_openrouter(
+        f"Develop a {config['genre']} story premise: {escape(config['prompt'])}",
+        config['model'],
+        preview("🌌", "Developing core concept...")
+    ), provider="openrouter")
+
+    # Phase 2: Outline Generation
+    add("outline", lambda premise: call_openrouter(
+        f"""Create detailed outline for {style} {config['genre']} novel: {premise}
+        Include chapter breakdowns, character arcs, and key plot points.""",
+        config['model'],
+        preview("📜", "Crafting detailed outline...")
+    ), deps=["premise"], provider="openrouter")
+
+    # Phase 3: Content Generation, every section fanned out once the outline exists.
+    # The outline is sliced once and each prompt carries only its share of it.
+    context = {}
+    context_lock = threading.Lock()
+
+    def builder(outline):
+        with context_lock:
+            if "builder" not in context:
+                context["builder"] = ContextBuilder(outline, sections)
+                for name, content in (written or {}).items():
+                    context["builder"].record(name, content)
+            return context["builder"]
+
+    def write_section(sec, outline, previous=None):
+        # Memory holds only what a prompt depends on: the book passed in as ``written`` and, when chained,
+        # the previous section. Sections fanned out in parallel never see each other, or the same inputs
+        # would build different prompts depending on which sibling happened to finish first.
+        ctx = builder(outline)
+        if previous is not None:
+            ctx.record(sections[sections.index(sec) - 1], previous)
+        content = call_openrouter(
+            ctx.build(sec, f"Write immersive '{sec}' content for {config['genre']} novel."),
+            config['model'],
+            preview("📖", f"Writing {sec}..."),
+            fresh=f"text:{sec}" in fresh
+        )
+        return content
+
+    for i, sec in enumerate(sections):
+        deps = ["outline"]
+        if CONTEXT_MEMORY == "written" and i:
+            deps.append(f"text:{sections[i-1]}")
+        add(f"text:{sec}", lambda outline, *previous, sec=sec: write_section(sec, outline, *previous),
+            deps=deps, provider="openrouter")
+        # Image steps return futures, so predictions overlap without tying up graph workers
+        add(f"image:{sec}", lambda content, sec=sec: submit_image(
+            f"{escape(content[:200])} {style} style", config['img_model'], sec, image_cache, group
+        ), deps=[f"text:{sec}"], provider="replicate")
+
+    # Phase 4: Final Assets, overlapped with the sections
+    add("cover", lambda premise: submit_image(
+        f"Cinematic cover art for {config['genre']} novel: {premise}",
+        config['img_model'],
+        "cover",
+        image_cache,
+        group
+    ), deps=["premise"], provider="replicate")
+    add("characters", lambda outline: json.loads(call_openrouter(
+        f"""Generate characters for {config['genre']} novel in JSON format:
+        {outline}
+        Format: [{{"name":"","role":"","personality":"","appearance":""}}]""",
+        config['model']
+    )), deps=["outline"], provider="openrouter")
+
+    return graph, sections
+
+STEP_LABELS = {
+    "premise": ("🌌", "Core concept ready"),
+    "outline": ("📜", "Outline crafted"),
+    "cover": ("🖼️", "Cover art created"),
+    "characters": ("👥", "Characters developed"),
+    "text": ("📖", "Wrote {}"),
+    "image": ("🎨", "Illustrated {}"),
+}
+RUNNING_LABELS = {
+    "premise": "concept",
+    "outline": "outline",
+    "cover": "cover art",
+    "characters": "characters",
+    "text": "{}",
+    "image": "art for {}",
+}
+
+def stream_previews(job: Job, progress: dict) -> Callable:
+    """``preview(emoji, message)`` factory for the steps of one job; returns None when previews are off."""
+    last_preview = {"at": 0.0}
+    preview_lock = threading.Lock()
+
+    def preview(emoji, message):
+        if not STREAM_PREVIEWS:
+            return None
+
+        def on_token(token, parts):
+            # Streams run concurrently, so throttle across all of them rather than per stream
+            now = time.monotonic()
+            with preview_lock:
+                if now - last_preview["at"] < PREVIEW_INTERVAL:
+                    return
+                last_preview["at"] = now
+            tail = "".join(parts[-PREVIEW_CHARS:])[-PREVIEW_CHARS:]
+            job.emit(emoji, message, progress["done"]/progress["total"], tail)
+        return on_token
+    return preview
+
+def run_generation(job: Job) -> dict:
+    config = job.config
+    image_cache = {}
+    journal = Journal(config['journal_id'])
+    journal.start(config)
+    _, completed, _ = journal.load()
+    # A failed illustration is not a finished step; journals written before this was skipped still have them
+    completed = {name: result for name, result in completed.items()
+                 if result is not None or name.partition(":")[0] not in ("image", "cover")}
+    for name, result in completed.items():
+        kind, _, sec = name.partition(":")
+        if kind == "image" and result is not None:
+            image_cache[sec] = result
+        elif kind == "cover" and result is not None:
+            image_cache["cover"] = result
+
+    progress = {"done": 0, "total": 1}
+    preview = stream_previews(job, progress)
+    recorder = Recorder()
+    graph, sections = build_generation_graph(config, image_cache, preview, recorder)
+    job.on_cancel(graph.cancel)
+    job.on_cancel(lambda: image_backend().cancel_group(config['journal_id']))
+    progress["total"] = len(graph)
+    progress["done"] = len(completed)
+
+    finished = threading.Event()
+    timer = threading.Timer(TIMEOUT, job.cancel) if TIMEOUT else None
+
+    def heartbeat():
+        while not finished.wait(10):
+            running = recorder.running()
+            message = "Processing " + ", ".join(
+                f"{RUNNING_LABELS[s.kind].format(s.name)} ({s.elapsed:.0f}s)" for s in running[:3]
+            ) + "..." if running else "Processing..."
+            job.emit("💓", message, progress["done"]/progress["total"])
+
+    def on_done(name, result, completed, total):
+        kind, _, sec = name.partition(":")
+        if result is not None or kind not in ("image", "cover"):
+            # Left out, a failed illustration is retried on resume rather than replayed as missing
+            journal.record(name, result)
+        progress["done"] = completed
+        emoji, label = STEP_LABELS[kind]
+        if kind in ("image", "cover") and result is None:
+            emoji, label = "⚠️", "No image for {}" if sec else "No cover art"
+        job.emit(emoji, label.format(sec), completed/total)
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    if timer:
+        timer.start()
+    try:
+        if completed:
+            job.emit("♻️", f"Resuming after {len(completed)} finished steps...", progress["done"]/progress["total"])
+        else:
+            job.emit("🌌", "Developing core concept...", 0)
+        results = graph.run(on_done=on_done, completed=completed)
+    except Exception:
+        if job.cancelled.is_set():
+            raise RuntimeError("Generation paused — use Resume to continue") from None
+        raise
+    finally:
+        finished.set()
+        if timer:
+            timer.cancel()
+
+    journal.complete()
+    timings = recorder.breakdown()
+    logger.info("job=%s timings=%s", job.id, json.dumps(timings))
+    book = {sec: results[f"text:{sec}"] for sec in sections}
+    if config.get('narrate', True):
+        # Narration renders in the background so the viewer and exporter find it cached
+        get_audio_library().prefetch(book.values())
+    return {
+        "book": book,
+        "outline": results["outline"],
+        "cover": results["cover"],
+        "characters": results["characters"],
+        "image_cache": image_cache,
+        "timings": timings,
+        "config": config,
+    }
+
+BOOK_STATE = ("book", "outline", "characters", "image_cache", "cover")
+
+def regenerate_section(job: Job) -> dict:
+    """Rewrite one section, and its illustration if asked, reusing every other artifact.
+
+    The config holds the book's generation settings, the current book state
+    (``BOOK_STATE``), the ``section`` to rewrite and ``redraw_image``. Every
+    other step of the generation graph is passed in as already completed, so
+    only the rewritten steps call a provider. Audio, exports and project rows
+    are keyed by content and rebuild for just the changed section on next use.
+    """
+    config = job.config
+    # A copy, so a failed or cancelled rewrite leaves the caller's book as it was
+    book, sec = config["book"].copy(), config["section"]
+    sections = list(book)
+    if sec not in sections:
+        raise ValueError(f"No section {sec!r} in this book")
+    settings = {k: v for k, v in config.items() if k not in BOOK_STATE + ("section", "redraw_image")}
+    image_cache = dict(config["image_cache"])
+
+    # The rerun set is read off the dependency graph: the text and the generated steps downstream
+    # of it, less its image when the user keeps that
+    text = f"text:{sec}"
+    dependencies = book_dependencies(sections, FORMATS)
+    downstream = [name for name in dependencies.invalidated([text]) if name.partition(":")[0] in STEP_LABELS]
+    kept = [] if config.get("redraw_image") else [name for name in downstream if name.startswith("image:")]
+    rebuild = [text] + [name for name in downstream if name not in kept]
+    stale = [name for name in dependencies.invalidated(rebuild, keep=kept)
+             if name.partition(":")[0] not in STEP_LABELS]
+    for name in rebuild:
+        kind, _, label = name.partition(":")
+        if kind == "image":
+            image_cache.pop(label, None)
+
+    completed = {"premise": None, "outline": config["outline"], "characters": config["characters"],
+                 "cover": config["cover"]}
+    for other in sections:
+        # Only rewritten steps read these, and they read just the previous section's text
+        completed[f"text:{other}"] = None
+        completed[f"image:{other}"] = image_cache.get(other)
+    index = sections.index(sec)
+    if CONTEXT_MEMORY == "written" and index:
+        completed[f"text:{sections[index - 1]}"] = book[sections[index - 1]]
+    for name in rebuild:
+        completed.pop(name, None)
+
+    progress = {"done": 0, "total": len(rebuild)}
+    recorder = Recorder()
+    # The rewrite gets its "story so far" from the sections before it; only those its memory draws on
+    # are read, so a lazily loaded book stays lazy
+    earlier = {other: book[other] for other in memory_sources(sections, sec)}
+    graph, _ = build_generation_graph({**settings, "fresh": rebuild}, image_cache,
+                                      stream_previews(job, progress), recorder, sections, earlier)
+    job.on_cancel(graph.cancel)
+    if settings.get("journal_id"):
+        job.on_cancel(lambda: image_backend().cancel_group(settings["journal_id"]))
+
+    def on_done(name, result, completed, total):
+        progress["done"] += 1
+        kind, _, label = name.partition(":")
+        emoji, message = STEP_LABELS[kind]
+        if kind == "image" and result is None:
+            emoji, message = "⚠️", "No image for {}"
+        job.emit(emoji, message.format(label), progress["done"]/progress["total"])
+
+    job.emit("📖", f"Rewriting {sec}...", 0)
+    results = graph.run(on_done=on_done, completed=completed)
+    book[sec] = results[f"text:{sec}"]
+    if settings.get("narrate", True):
+        get_audio_library().submit(book[sec])
+    timings = recorder.breakdown()
+    logger.info("job=%s regenerated=%s stale=%s timings=%s", job.id, rebuild, stale, json.dumps(timings))
+    return {
+        "book": book,
+        "outline": config["outline"],
+        "cover": config["cover"],
+        "characters": config["characters"],
+        "image_cache": image_cache,
+        "timings": timings,
+        "config": settings,
+        "regenerated": rebuild,
+        # Derived from the rewrite, so rebuilt on next use
+        "stale": stale,
+        "kept": kept,
+    }
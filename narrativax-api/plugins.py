@@ -0,0 +1,72 @@
+import importlib
+import os
+import threading
+from typing import Any, Dict, List
+
+
+class Registry:
+    """Named plugins, each imported the first time it is used.
+
+    Plugins are registered as ``"module:attribute"`` strings, so registering
+    one costs nothing at startup and its dependencies load only when ``get``
+    first asks for it. Extra plugins can be listed in ``env`` as
+    comma-separated ``name=module:attribute`` pairs; they are applied after
+    ``defaults``, so an entry there replaces the built-in of the same name.
+    """
+
+    def __init__(self, kind: str, env: str = None, defaults: Dict[str, Any] = None):
+        self.kind = kind
+        self._targets: Dict[str, Any] = dict(defaults or {})
+        self._loaded: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        for item in os.getenv(env, "").split(",") if env else ():
+            name, _, target = item.strip().partition("=")
+            if target:
+                self.register(name.strip(), target.strip())
+
+    def register(self, name: str, target: Any):
+        """Register ``target``: a ``"module:attribute"`` path, or the object itself."""
+        with self._lock:
+            self._targets[name] = target
+            self._loaded.pop(name, None)
+
+    def get(self, name: str) -> Any:
+        with self._lock:
+            if name in self._loaded:
+                return self._loaded[name]
+            if name not in self._targets:
+                raise KeyError(f"Unknown {self.kind} {name!r}; available: {', '.join(self._targets)}")
+            target = self._targets[name]
+            if isinstance(target, str):
+                module, _, attribute = target.partition(":")
+                target = getattr(importlib.import_module(module), attribute)
+            self._loaded[name] = target
+            return target
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._targets)
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self._targets
+
+
+# build(book, image_cache, cover, workdir) -> [(path, arcname)]
+EXPORTERS = Registry("export format", "NARRATIVAX_EXPORTERS", {
+    "docx": "export_docx:build_docx",
+    "pdf": "export_pdf:build_pdf",
+    "mp3": "export_mp3:build_mp3",
+    "epub": "export_epub:build_epub",
+})
+
+# TTSEngine subclasses
+TTS_ENGINES = Registry("TTS engine", "NARRATIVAX_TTS_ENGINES", {
+    "gtts": "tts:GTTSEngine",
+    "silent": "tts:SilentEngine",
+})
+
+# Factories returning a scheduler with submit(model, inputs, group) and cancel_group(group)
+IMAGE_BACKENDS = Registry("image backend", "NARRATIVAX_IMAGE_BACKENDS", {
+    "replicate": "image_scheduler:get_image_scheduler",
+})
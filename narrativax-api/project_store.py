@@ -0,0 +1,266 @@
+import base64
+import binascii
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from urllib.parse import quote
+from typing import Dict, Iterator, List, Optional
+
+from image_store import ImageHandle, get_image_store
+
+PROJECT_DIR = os.getenv("NARRATIVAX_PROJECT_DIR", os.path.join(os.getenv("NARRATIVAX_CACHE_DIR", ".narrativax_cache"), "projects"))
+PROJECT_ID = re.compile(r"^[0-9a-f]{8,64}$")
+MAX_OPEN_PROJECTS = int(os.getenv("NARRATIVAX_MAX_OPEN_PROJECTS", "16"))
+# The single-file JSON save written by earlier versions, imported once into the first project loaded
+LEGACY_PATH = os.getenv("NARRATIVAX_LEGACY_PROJECT", "session.narrx")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, digest TEXT NOT NULL, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS sections (name TEXT PRIMARY KEY, position INTEGER NOT NULL, digest TEXT NOT NULL, content TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS image_refs (key TEXT PRIMARY KEY, digest TEXT NOT NULL, ext TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS images (digest TEXT PRIMARY KEY, data BLOB NOT NULL);
+"""
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def project_path(project_id: str) -> str:
+    if not PROJECT_ID.match(project_id or ""):
+        raise ValueError("Project IDs are 8-64 lowercase hex characters")
+    return os.path.join(PROJECT_DIR, f"{project_id}.narrx")
+
+
+class ProjectStore:
+    """Chunked project container backed by SQLite.
+
+    Sections, metadata and images are separate rows, each stored with a
+    content digest. ``save`` compares digests and writes only what changed;
+    ``open_book`` reads just the index, with section text and image bytes
+    fetched when first used.
+
+    A read-only store never creates its file. ``close`` releases the
+    connection; the next read reopens it, so books opened from a closed
+    store keep working.
+    """
+
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        self.readonly = readonly
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        if readonly:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"No saved project at {path}")
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._lock, self._db() as conn:
+            conn.executescript(SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        # Caller holds the lock. Lazily loaded sections can be read from export worker threads
+        if self._conn is None:
+            if self.readonly:
+                self._conn = sqlite3.connect(f"file:{quote(os.path.abspath(self.path))}?mode=ro", uri=True,
+                                             timeout=30, check_same_thread=False)
+            else:
+                self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def exists(self) -> bool:
+        with self._lock:
+            return self._db().execute("SELECT 1 FROM sections LIMIT 1").fetchone() is not None
+
+    def save(self, book, outline, characters, image_cache: dict, cover: Optional[ImageHandle],
+             config: Optional[dict] = None) -> dict:
+        """Write the project incrementally; returns how many records were written."""
+        if self.readonly:
+            raise PermissionError("Project was opened read-only")
+        written = {"sections": 0, "images": 0, "meta": 0}
+        store = get_image_store()
+        refs = {k: v for k, v in image_cache.items() if isinstance(v, ImageHandle)}
+        if cover:
+            refs["cover"] = cover
+
+        with self._lock, self._db() as conn:
+            known = dict(conn.execute("SELECT name, digest FROM sections"))
+            # Same file, even if the book came from a read-only or since-closed handle on it
+            same_project = isinstance(book, ProjectBook) and book.project.path == self.path
+            for position, name in enumerate(book):
+                if same_project and not book.is_loaded(name) and name in known:
+                    # Never fetched, so necessarily unchanged; just keep its order
+                    conn.execute("UPDATE sections SET position = ? WHERE name = ?", (position, name))
+                    continue
+                content = book[name]
+                digest = _digest(content)
+                if known.get(name) != digest:
+                    conn.execute("INSERT OR REPLACE INTO sections VALUES (?, ?, ?, ?)", (name, position, digest, content))
+                    written["sections"] += 1
+                else:
+                    conn.execute("UPDATE sections SET position = ? WHERE name = ?", (position, name))
+            for name in set(known) - set(book):
+                conn.execute("DELETE FROM sections WHERE name = ?", (name,))
+
+            known_meta = dict(conn.execute("SELECT key, digest FROM meta"))
+            # The generation settings are kept so a loaded book can have sections regenerated
+            items = [("outline", outline), ("characters", characters)] + ([("config", config)] if config else [])
+            for key, value in items:
+                raw = json.dumps(value, ensure_ascii=False)
+                digest = _digest(raw)
+                if known_meta.get(key) != digest:
+                    conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?, ?)", (key, digest, raw))
+                    written["meta"] += 1
+
+            stored = {row[0] for row in conn.execute("SELECT digest FROM images")}
+            conn.execute("DELETE FROM image_refs")
+            for key, handle in refs.items():
+                conn.execute("INSERT INTO image_refs VALUES (?, ?, ?)", (key, handle.digest, handle.ext))
+                if handle.digest not in stored:
+                    conn.execute("INSERT INTO images VALUES (?, ?)", (handle.digest, store.read(handle)))
+                    stored.add(handle.digest)
+                    written["images"] += 1
+            conn.execute("DELETE FROM images WHERE digest NOT IN (SELECT digest FROM image_refs)")
+        return written
+
+    def set_journal(self, journal_id: str):
+        """Remember the journal of the book being generated into this project, so it survives the session."""
+        if self.readonly:
+            raise PermissionError("Project was opened read-only")
+        raw = json.dumps(journal_id)
+        with self._lock, self._db() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?, ?)", ("journal_id", _digest(raw), raw))
+
+    def open_book(self) -> dict:
+        """Load the index: section names, metadata and image handles, but no bodies."""
+        with self._lock:
+            conn = self._db()
+            names = [row[0] for row in conn.execute("SELECT name FROM sections ORDER BY position")]
+            meta = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM meta")}
+            refs = {key: ImageHandle(digest, ext) for key, digest, ext in conn.execute("SELECT key, digest, ext FROM image_refs")}
+        get_image_store().add_source(self.image_bytes)
+        cover = refs.pop("cover", None)
+        return {
+            "book": ProjectBook(self, names),
+            "outline": meta.get("outline"),
+            "characters": meta.get("characters"),
+            "image_cache": refs,
+            "cover": cover,
+            "config": meta.get("config"),
+            "journal_id": meta.get("journal_id"),
+        }
+
+    def section(self, name: str) -> str:
+        with self._lock:
+            row = self._db().execute("SELECT content FROM sections WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row[0]
+
+    def image_bytes(self, digest: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._db().execute("SELECT data FROM images WHERE digest = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+
+class ProjectBook(MutableMapping):
+    """Ordered section mapping whose text is read from the project on first access."""
+
+    def __init__(self, project: ProjectStore, names: List[str]):
+        self._project = project
+        self._names = list(names)
+        self._loaded: Dict[str, str] = {}
+
+    @property
+    def project(self) -> ProjectStore:
+        return self._project
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
+
+    def copy(self) -> "ProjectBook":
+        """An independent mapping over the same project; sections not yet read stay unread."""
+        book = ProjectBook(self._project, self._names)
+        book._loaded = dict(self._loaded)
+        return book
+
+    def __getitem__(self, name: str) -> str:
+        if name not in self._loaded:
+            if name not in self._names:
+                raise KeyError(name)
+            self._loaded[name] = self._project.section(name)
+        return self._loaded[name]
+
+    def __setitem__(self, name: str, content: str):
+        if name not in self._names:
+            self._names.append(name)
+        self._loaded[name] = content
+
+    def __delitem__(self, name: str):
+        self._names.remove(name)
+        self._loaded.pop(name, None)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._names))
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+_projects: "OrderedDict[str, ProjectStore]" = OrderedDict()
+_projects_lock = threading.Lock()
+
+
+def open_project(project_id: str, readonly: bool = False) -> ProjectStore:
+    """Shared store for a project; the least recently used beyond MAX_OPEN_PROJECTS are closed.
+
+    ``readonly`` is for loading: it raises FileNotFoundError for an unknown
+    ID instead of creating an empty project, and reuses a writable store
+    when one is already open.
+    """
+    path = project_path(project_id)
+    with _projects_lock:
+        store = _projects.get(path)
+        if store is None or (store.readonly and not readonly):
+            store = _projects[path] = ProjectStore(path, readonly)
+        _projects.move_to_end(path)
+        while len(_projects) > MAX_OPEN_PROJECTS:
+            _, evicted = _projects.popitem(last=False)
+            evicted.close()
+        return store
+
+
+def import_legacy(project_id: str, path: str = LEGACY_PATH) -> bool:
+    """Import an old single-file JSON save into ``project_id``; returns whether one was imported.
+
+    The file is renamed afterwards, so the import happens once.
+    """
+    if not os.path.exists(path) or os.path.exists(project_path(project_id)):
+        return False
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    store = get_image_store()
+
+    def image(value) -> Optional[ImageHandle]:
+        # Images were saved as base64 PNG strings
+        try:
+            return store.put_bytes(base64.b64decode(value)) if isinstance(value, str) else None
+        except (binascii.Error, ValueError, OSError):
+            return None
+
+    image_cache = {key: handle for key, handle in ((k, image(v)) for k, v in (data.get("image_cache") or {}).items()) if handle}
+    open_project(project_id).save(data.get("book") or {}, data.get("outline"), data.get("characters"),
+                                  image_cache, image(data.get("cover")))
+    os.replace(path, path + ".imported")
+    return True
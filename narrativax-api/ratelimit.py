@@ -0,0 +1,52 @@
+import multiprocessing
+import time
+from typing import Dict, Optional
+
+
+class SharedRateLimiter:
+    """Per-provider token buckets in shared memory.
+
+    Created in a parent process and handed to its workers at start-up, so
+    every process draws from one requests-per-minute budget per provider.
+    Providers without a rate are not throttled.
+    """
+
+    def __init__(self, per_minute: Dict[str, float], burst: float = 1.0, context=None):
+        context = context or multiprocessing.get_context()
+        self.rates = {provider: rate / 60 for provider, rate in per_minute.items() if rate}
+        self.burst = max(1.0, burst)
+        # [tokens, last refill] per provider, guarded by one lock
+        self._buckets = {provider: context.RawArray("d", [self.burst, time.time()]) for provider in self.rates}
+        self._lock = context.Lock()
+
+    def acquire(self, provider: str) -> float:
+        """Block until ``provider`` may be called; returns the seconds spent waiting."""
+        rate = self.rates.get(provider)
+        if not rate:
+            return 0.0
+        bucket, waited = self._buckets[provider], 0.0
+        while True:
+            with self._lock:
+                now = time.time()
+                tokens = min(self.burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+                if tokens >= 1:
+                    bucket[0] = tokens - 1
+                    return waited
+                bucket[0] = tokens
+                delay = (1 - tokens) / rate
+            time.sleep(delay)
+            waited += delay
+
+
+_limiter: Optional[SharedRateLimiter] = None
+
+
+def set_rate_limiter(limiter: Optional[SharedRateLimiter]):
+    global _limiter
+    _limiter = limiter
+
+
+def throttle(provider: str) -> float:
+    """Wait for the process-wide limiter, if one is installed."""
+    return _limiter.acquire(provider) if _limiter else 0.0
@@ -0,0 +1,127 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class TaskGraph:
+    """Runs named callables once their dependencies finish.
+
+    Each task receives its dependencies' results as positional arguments, in
+    the order they were declared. Tasks tagged with a provider are throttled
+    by that provider's limit, so a wide fan-out never holds more than
+    ``limits[provider]`` calls in flight against one API.
+
+    A task may return a ``Future`` to finish asynchronously: its worker is
+    freed at once, while its provider slot and dependants wait for the
+    future to settle.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, max_workers: int = 8):
+        self.limits = dict(limits or {})
+        self.max_workers = max_workers
+        self._tasks: Dict[str, dict] = {}
+        self._cancelled = threading.Event()
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Iterable[str] = (), provider: Optional[str] = None):
+        if name in self._tasks:
+            raise ValueError(f"Duplicate task: {name}")
+        self._tasks[name] = {"fn": fn, "deps": list(deps), "provider": provider}
+        return name
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _validate(self):
+        for name, task in self._tasks.items():
+            missing = [d for d in task["deps"] if d not in self._tasks]
+            if missing:
+                raise ValueError(f"Task {name} depends on unknown task(s): {', '.join(missing)}")
+
+    def run(self, on_done: Optional[Callable[[str, Any, int, int], None]] = None,
+            completed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Execute the graph and return ``{name: result}``.
+
+        ``on_done(name, result, completed, total)`` is called from the calling
+        thread as each task finishes, so it is safe to touch caller-owned state
+        there. Results passed in ``completed`` are taken as already done and
+        their tasks are skipped. The first task failure cancels everything not
+        yet started and is re-raised.
+        """
+        self._validate()
+        total = len(self._tasks)
+        results: Dict[str, Any] = {k: v for k, v in (completed or {}).items() if k in self._tasks}
+        waiting = {
+            name: set(task["deps"]) - set(results)
+            for name, task in self._tasks.items() if name not in results
+        }
+        in_flight: Dict[str, int] = {}
+        ready = [name for name, deps in waiting.items() if not deps]
+        for name in ready:
+            del waiting[name]
+        running = {}
+        settling = {}  # futures returned by asynchronous tasks; they hold no worker
+
+        def has_slot(name):
+            provider = self._tasks[name]["provider"]
+            if provider is None or provider not in self.limits:
+                return True
+            return in_flight.get(provider, 0) < self.limits[provider]
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while ready or running or settling:
+                if self._cancelled.is_set():
+                    raise RuntimeError("Task graph cancelled")
+
+                for name in list(ready):
+                    if len(running) >= self.max_workers:
+                        break
+                    if not has_slot(name):
+                        continue
+                    ready.remove(name)
+                    task = self._tasks[name]
+                    provider = task["provider"]
+                    if provider is not None:
+                        in_flight[provider] = in_flight.get(provider, 0) + 1
+                    args = [results[d] for d in task["deps"]]
+                    running[executor.submit(task["fn"], *args)] = name
+
+                if not running and not settling:
+                    raise RuntimeError(f"Task graph stalled with pending tasks: {', '.join(ready)}")
+
+                done, _ = wait([*running, *settling], timeout=1.0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future, None) or settling.pop(future)
+                    result = future.result()
+                    if isinstance(result, Future):
+                        settling[result] = name
+                        continue
+                    provider = self._tasks[name]["provider"]
+                    if provider is not None:
+                        in_flight[provider] -= 1
+                    results[name] = result
+
+                    for other, deps in list(waiting.items()):
+                        deps.discard(name)
+                        if not deps:
+                            del waiting[other]
+                            ready.append(other)
+
+                    if on_done:
+                        on_done(name, results[name], len(results), total)
+
+            if waiting:
+                raise RuntimeError(f"Task graph has a dependency cycle: {', '.join(waiting)}")
+        except BaseException:
+            self._cancelled.set()
+            for future in [*running, *settling]:
+                future.cancel()
+            # A stuck worker (a hung stream, say) must not hold up the caller; it finishes on its own
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+
+        return results
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# The app's modules are flat files in narrativax-api/, imported by name as main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Read at import time by every store, so set before any test imports one
+os.environ["NARRATIVAX_CACHE_DIR"] = tempfile.mkdtemp(prefix="narrativax-tests-")
+os.environ.setdefault("NARRATIVAX_TTS_ENGINE", "silent")
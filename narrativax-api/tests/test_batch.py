@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+import batch
+
+
+def write_catalog(tmp_path, *lines):
+    path = tmp_path / "catalog.jsonl"
+    path.write_text("\n".join(json.dumps(line) if isinstance(line, dict) else line for line in lines) + "\n")
+    return str(path)
+
+
+BOOK = {"prompt": "A lighthouse keeper", "genre": "Fantasy", "tone": "Mystical", "chapters": 3}
+
+
+def test_configs_get_stable_ids_and_defaults(tmp_path):
+    first = batch.load_configs(write_catalog(tmp_path, BOOK, "", {**BOOK, "project_id": "ab12cd34"}))
+    again = batch.load_configs(write_catalog(tmp_path, BOOK, "", {**BOOK, "project_id": "ab12cd34"}))
+    assert [c["line"] for c in first] == [1, 3]
+    assert first[0]["journal_id"] == again[0]["journal_id"]
+    assert first[1]["project_id"] == "ab12cd34"
+    assert first[0]["narrate"] is False
+
+
+@pytest.mark.parametrize("line, message", [
+    ('{"prompt": ', "Line 2: invalid JSON"),
+    ({**BOOK, "project_id": "my-book"}, "Line 2: project_id"),
+    ({**BOOK, "tone": "Grim"}, "Line 2: unknown tone"),
+    ({**BOOK, "chapters": 31}, "Line 2: chapters"),
+])
+def test_bad_lines_are_reported_with_their_number(tmp_path, line, message):
+    with pytest.raises(ValueError, match=message):
+        batch.load_configs(write_catalog(tmp_path, BOOK, line))
+
+
+def test_unopenable_project_is_an_error_row_not_a_crash():
+    result = batch.generate_book({**BOOK, "project_id": "not hex", "line": 4})
+    assert result["line"] == 4 and "Project IDs" in result["error"]
+
+
+def test_summary_counts_and_percentiles():
+    results = [{"seconds": s} for s in (10.0, 20.0, 30.0)] + [{"skipped": True, "seconds": 0.0},
+                                                               {"error": "x", "seconds": 1.0}]
+    summary = batch.summarize(results, wall=60.0)
+    assert (summary["generated"], summary["skipped"], summary["failed"]) == (3, 1, 1)
+    assert summary["latency_seconds"]["p50"] == 20.0 and summary["books_per_hour"] == 180.0
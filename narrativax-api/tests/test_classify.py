@@ -0,0 +1,58 @@
+import asyncio
+import importlib.util
+import os
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("openai")
+
+# The classifier ships with the API docs rather than the app
+CLASSIFY = os.path.join(os.path.dirname(__file__), "..", "..", "docs", "narrativax-api", "classify.py")
+
+
+@pytest.fixture
+def classify(monkeypatch):
+    spec = importlib.util.spec_from_file_location("classify", CLASSIFY)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    calls = []
+
+    async def complete(excerpt):
+        calls.append(excerpt)
+        await asyncio.sleep(0.05)
+        return f"Genre: {len(calls)}"
+
+    monkeypatch.setattr(module, "_complete", complete)
+    module.calls = calls
+    return module
+
+
+def test_identical_stories_share_one_call(classify):
+    async def run():
+        first = await asyncio.gather(*(classify.classify_text("A lighthouse.") for _ in range(5)))
+        return first, await classify.classify_text("A lighthouse.")
+
+    first, again = asyncio.run(run())
+    assert first == ["Genre: 1"] * 5 and again == "Genre: 1"
+    assert classify.calls == ["A lighthouse."] and classify._in_flight == {}
+
+
+def test_only_the_excerpt_is_the_cache_key(classify):
+    head = "x" * classify.MAX_CHARS
+
+    async def run():
+        return [await classify.classify_text(head + tail) for tail in ("", " ending one", " ending two")]
+
+    assert asyncio.run(run()) == ["Genre: 1"] * 3 and classify.calls == [head]
+
+
+def test_a_cancelled_caller_leaves_the_shared_call_running(classify):
+    async def run():
+        abandoned = asyncio.ensure_future(classify.classify_text("A lighthouse."))
+        waiting = asyncio.ensure_future(classify.classify_text("A lighthouse."))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        return await waiting
+
+    assert asyncio.run(run()) == "Genre: 1" and classify.calls == ["A lighthouse."]
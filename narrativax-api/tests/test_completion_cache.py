@@ -0,0 +1,53 @@
+import time
+
+from completion_cache import CompletionCache, completion_key, get_completion_cache
+
+
+def test_round_trip_and_stats(tmp_path):
+    cache = CompletionCache(str(tmp_path / "c.sqlite3"))
+    key = completion_key("m", "Once upon a time", 0.95, 1800, seed=7)
+    assert cache.get(key) is None
+    cache.put(key, "there was a lighthouse ✨", latency=2.5)
+    assert cache.get(key) == "there was a lighthouse ✨"
+    stats = cache.snapshot()
+    assert (stats["hits"], stats["misses"], stats["saved_seconds"]) == (1, 1, 2.5)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_entries_survive_reopening(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    CompletionCache(path).put("k", "v")
+    assert CompletionCache(path).get("k") == "v"
+
+
+def test_key_covers_every_request_field():
+    base = ("m", "p", 0.95, 1800, 1)
+    keys = {completion_key(*base)}
+    for i, changed in enumerate(("m2", "p2", 0.5, 100, 2)):
+        keys.add(completion_key(*base[:i], changed, *base[i + 1:]))
+    assert len(keys) == 6
+
+
+def test_evicts_least_recently_used_beyond_the_size_cap(tmp_path):
+    cache = CompletionCache(str(tmp_path / "c.sqlite3"), max_bytes=20)
+    cache.put("old", "x" * 10)
+    time.sleep(0.01)
+    cache.put("used", "y" * 10)
+    time.sleep(0.01)
+    cache.get("old")
+    time.sleep(0.01)
+    cache.put("new", "z" * 10)
+    assert cache.get("used") is None
+    assert cache.get("old") == "x" * 10 and cache.get("new") == "z" * 10
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = CompletionCache(str(tmp_path / "c.sqlite3"), max_age=0.05)
+    cache.put("k", "v")
+    time.sleep(0.1)
+    assert cache.get("k") is None
+
+
+def test_shared_cache_is_off_without_a_seed(monkeypatch):
+    monkeypatch.delenv("NARRATIVAX_SEED", raising=False)
+    assert get_completion_cache() is None
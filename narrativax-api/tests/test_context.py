@@ -0,0 +1,106 @@
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+import pipeline
+from context import (ContextBuilder, estimate_tokens, memory_sources, parse_number, split_evenly, split_outline,
+                     trim_to_tokens)
+
+OUTLINE = """A keeper finds letters from the future.
+
+## Prologue
+The lamp goes dark.
+
+**Chapter One:** The first letter.
+Chapter 2 - The tide turns.
+CHAPTER III: Storm.
+Ch. twenty-one: Far ahead.
+
+Epilogue
+The lamp is lit again.
+"""
+
+
+@pytest.mark.parametrize("text, number", [
+    ("7", 7), ("One", 1), ("nineteen", 19), ("Twenty-One", 21), ("forty two", 42), ("XXIV", 24), ("iv", 4),
+    ("did", None), ("iiv", None),
+])
+def test_parse_number(text, number):
+    assert parse_number(text) == number
+
+
+def test_split_outline_finds_every_heading_style():
+    slices = split_outline(OUTLINE)
+    assert slices["overview"] == "A keeper finds letters from the future."
+    assert set(slices) == {"overview", "Foreword", "Chapter 1", "Chapter 2", "Chapter 3", "Chapter 21", "Epilogue"}
+    assert "tide turns" in slices["Chapter 2"] and "Storm" not in slices["Chapter 2"]
+
+
+def test_headingless_outline_is_shared_out_in_order():
+    paragraphs = [f"Beat {i} " + "words " * 20 for i in range(6)]
+    slices = split_evenly("\n\n".join(paragraphs), ["Foreword", "Chapter 1", "Epilogue"])
+    assert slices["Foreword"].startswith("Beat 0") and slices["Epilogue"].endswith(paragraphs[-1].strip())
+    assert ContextBuilder("\n\n".join(paragraphs), ["Foreword", "Chapter 1", "Epilogue"]).slices["Chapter 1"]
+
+
+def test_trim_to_tokens_cuts_on_a_word_boundary():
+    text = "word " * 100
+    trimmed = trim_to_tokens(text, 10)
+    assert estimate_tokens(trimmed) <= 11 and trimmed.endswith(" ...")
+    assert trim_to_tokens("short", 10) == "short"
+
+
+def test_prompt_stays_within_budget_and_keeps_its_own_slice_first():
+    outline = "Overview. " * 200 + "\n" + "\n".join(f"Chapter {i}: " + f"plan {i} " * 300 for i in range(1, 6))
+    sections = [f"Chapter {i}" for i in range(1, 6)]
+    builder = ContextBuilder(outline, sections, budget=400)
+    builder.record("Chapter 1", "It began. Then more. It ended.")
+    prompt = builder.build("Chapter 2", "Write it.")
+    assert estimate_tokens(prompt) <= 400 + 20  # labels and separators
+    assert prompt.index("Outline for Chapter 2") < prompt.index("Story so far") < prompt.index("Story overview")
+    assert "Chapter 1: It began. It ended." in prompt
+
+
+def test_memory_draws_on_a_window_of_earlier_sections():
+    sections = [f"Chapter {i}" for i in range(1, 31)]
+    assert memory_sources(sections, "Chapter 1") == []
+    assert memory_sources(sections, "Chapter 30") == sections[-13:-1]
+
+
+def run_book(monkeypatch, seed):
+    prompts, lock, jitter = {}, threading.Lock(), random.Random(seed)
+    outline = "Overview.\n" + "\n".join(f"Chapter {i}: beat {i}." for i in range(1, 5))
+
+    def call_openrouter(prompt, model, on_token=None, fresh=False):
+        with lock:
+            delay = jitter.random() / 50
+        time.sleep(delay)
+        if prompt.startswith("Generate characters"):
+            return "[]"
+        if prompt.startswith("Create detailed outline"):
+            return outline
+        with lock:
+            prompts[prompt.splitlines()[0]] = prompt
+        return f"{prompt.splitlines()[0]} happened. Then it ended."
+
+    def submit_image(*args, **kwargs):
+        done = Future()
+        done.set_result(None)
+        return done
+
+    monkeypatch.setattr(pipeline, "call_openrouter", call_openrouter)
+    monkeypatch.setattr(pipeline, "submit_image", submit_image)
+    config = {"prompt": "p", "genre": "Fantasy", "tone": "Mystical", "chapters": 4, "model": "m", "img_model": "x"}
+    graph, _ = pipeline.build_generation_graph(config, {})
+    graph.run()
+    return prompts
+
+
+@pytest.mark.parametrize("memory", ["outline", "written"])
+def test_identical_runs_send_identical_prompts(monkeypatch, memory):
+    monkeypatch.setattr(pipeline, "CONTEXT_MEMORY", memory)
+    first, second = run_book(monkeypatch, 1), run_book(monkeypatch, 2)
+    assert len(first) == 7 and first == second
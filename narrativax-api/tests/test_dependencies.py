@@ -0,0 +1,103 @@
+from concurrent.futures import Future
+
+import pytest
+
+import context
+import pipeline
+from dependencies import DependencyGraph, book_dependencies
+from jobs import Job
+from project_store import ProjectStore
+
+SECTIONS = ["Foreword", "Chapter 1", "Chapter 2", "Epilogue"]
+
+
+def test_invalidated_is_nearest_first_and_respects_keep():
+    graph = DependencyGraph()
+    graph.add("a")
+    graph.add("b", ["a"])
+    graph.add("c", ["b"])
+    graph.add("d", ["a", "c"])
+    assert graph.invalidated(["a"]) == ["b", "d", "c"]
+    assert graph.invalidated(["a"], keep=["b"]) == ["d"]
+    assert graph.inputs("d") == ["a", "c"] and "d" in graph and "z" not in graph
+
+
+def test_book_graph_follows_text_to_its_derived_artifacts():
+    graph = book_dependencies(SECTIONS, ["pdf", "mp3"])
+    stale = set(graph.invalidated(["text:Chapter 1"]))
+    assert stale == {"image:Chapter 1", "audio:Chapter 1", "chunk:Chapter 1", "chunk:image:Chapter 1",
+                     "export:pdf", "export:mp3"}
+    # Sections read the outline, not each other
+    assert "text:Chapter 2" not in stale
+    assert "text:Chapter 2" in graph.invalidated(["outline"])
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    calls = {"text": [], "image": []}
+
+    def call_openrouter(prompt, model, on_token=None, fresh=False):
+        calls["text"].append(prompt)
+        return "Rewritten. " + prompt.splitlines()[0]
+
+    def submit_image(prompt, model_key, id_key, cache, group=None):
+        calls["image"].append(id_key)
+        cache[id_key] = "new image"
+        done = Future()
+        done.set_result("new image")
+        return done
+
+    monkeypatch.setattr(pipeline, "call_openrouter", call_openrouter)
+    monkeypatch.setattr(pipeline, "submit_image", submit_image)
+    return calls
+
+
+def regenerate(book, section, redraw_image=False):
+    config = {"prompt": "p", "genre": "Fantasy", "tone": "Mystical", "chapters": 2, "model": "m", "img_model": "x",
+              "narrate": False, "book": book, "outline": "Chapter 1: a.\nChapter 2: b.", "characters": [],
+              "image_cache": {s: f"old image {s}" for s in book}, "cover": None, "section": section,
+              "redraw_image": redraw_image}
+    return pipeline.regenerate_section(Job("s", pipeline.regenerate_section, config))
+
+
+def test_rewrite_keeps_the_image_and_reports_what_goes_stale(provider):
+    book = {s: f"Old {s}." for s in SECTIONS}
+    result = regenerate(book, "Chapter 1")
+    assert result["regenerated"] == ["text:Chapter 1"] and result["kept"] == ["image:Chapter 1"]
+    assert {"audio:Chapter 1", "chunk:Chapter 1", "export:pdf"} <= set(result["stale"])
+    assert "chunk:image:Chapter 1" not in result["stale"]
+    assert len(provider["text"]) == 1 and provider["image"] == []
+    assert result["book"]["Chapter 1"].startswith("Rewritten.")
+    assert result["image_cache"]["Chapter 1"] == "old image Chapter 1"
+    # The caller's book is left alone; the rewrite comes back in the result
+    assert book["Chapter 1"] == "Old Chapter 1."
+
+
+def test_redraw_rebuilds_the_image_too(provider):
+    result = regenerate({s: f"Old {s}." for s in SECTIONS}, "Chapter 2", redraw_image=True)
+    assert result["regenerated"] == ["text:Chapter 2", "image:Chapter 2"] and result["kept"] == []
+    assert provider["image"] == ["Chapter 2"] and result["image_cache"]["Chapter 2"] == "new image"
+
+
+def test_failed_rewrite_leaves_the_book_untouched(monkeypatch):
+    def fail(*args, **kwargs):
+        raise ConnectionError("provider down")
+
+    monkeypatch.setattr(pipeline, "call_openrouter", fail)
+    book = {s: f"Old {s}." for s in SECTIONS}
+    with pytest.raises(ConnectionError):
+        regenerate(book, "Chapter 1")
+    assert book == {s: f"Old {s}." for s in SECTIONS}
+
+
+def test_rewrite_reads_only_the_sections_its_prompt_needs(provider, monkeypatch, tmp_path):
+    monkeypatch.setattr(context, "MEMORY_SECTIONS", 2)
+    sections = ["Foreword"] + [f"Chapter {i}" for i in range(1, 6)] + ["Epilogue"]
+    store = ProjectStore(str(tmp_path / "book.narrx"))
+    store.save({s: f"Text of {s}." for s in sections}, "outline", [], {}, None)
+    book = store.open_book()["book"]
+
+    result = regenerate(book, "Chapter 4")
+    assert [s for s in sections if book.is_loaded(s)] == []
+    assert [s for s in sections if result["book"].is_loaded(s)] == ["Chapter 2", "Chapter 3", "Chapter 4"]
+    assert "Chapter 3: Text of Chapter 3." in provider["text"][0]
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+import export
+from export import BookExporter, book_digest
+from image_store import ImageHandle
+
+BOOK = {"Foreword": "It begins.", "Chapter 1": "It continues.", "Epilogue": "It ends."}
+COVER = ImageHandle("c" * 64, "jpg")
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """Stand-in exporters that count builds and write a small file each."""
+    counts = {}
+
+    def builder(fmt):
+        def build(book, image_cache, cover, workdir):
+            counts[fmt] = counts.get(fmt, 0) + 1
+            path = os.path.join(workdir, f"book.{fmt}")
+            with open(path, "w") as f:
+                f.write("\n".join(book.values()))
+            return [(path, f"book.{fmt}")]
+        return build
+
+    monkeypatch.setattr(export.EXPORTERS, "get", builder)
+    return counts
+
+
+def test_digest_ignores_a_cover_kept_in_image_cache():
+    loaded = book_digest(BOOK, {"Chapter 1": ImageHandle("a" * 64, "jpg")}, COVER)
+    fresh = book_digest(BOOK, {"Chapter 1": ImageHandle("a" * 64, "jpg"), "cover": COVER}, COVER)
+    assert loaded == fresh
+    assert book_digest(BOOK, {}, None) != book_digest(BOOK, {}, COVER)
+    assert book_digest(BOOK, {}, None) != book_digest({**BOOK, "Epilogue": "It ends again."}, {}, None)
+
+
+def test_unchanged_book_is_served_from_the_cache(tmp_path, builds):
+    exporter = BookExporter(str(tmp_path))
+    first, timings = exporter.export(BOOK, {}, None, formats=("pdf", "docx"))
+    assert not timings["zip"]["cached"] and builds == {"pdf": 1, "docx": 1}
+    again, timings = exporter.export(dict(BOOK), {"cover": None}, None, formats=("pdf", "docx"))
+    assert again == first and timings == {"zip": {"seconds": 0.0, "cached": True}}
+
+
+def test_changed_book_rebuilds_only_formats_it_reaches(tmp_path, builds):
+    exporter = BookExporter(str(tmp_path))
+    exporter.export(BOOK, {}, None, formats=("pdf", "docx"))
+    _, timings = exporter.export(BOOK, {}, None, formats=("pdf",))
+    assert not timings["zip"]["cached"] and timings["pdf"]["cached"]
+    _, timings = exporter.export({**BOOK, "Chapter 1": "It changed."}, {}, None, formats=("pdf",))
+    assert not timings["pdf"]["cached"] and builds["pdf"] == 2
+
+
+def test_oldest_entries_are_evicted_beyond_the_cap(tmp_path, builds):
+    exporter = BookExporter(str(tmp_path), max_bytes=1)
+    kept, _ = exporter.export(BOOK, {}, None, formats=("pdf",))
+    newest, _ = exporter.export({**BOOK, "Chapter 1": "Another."}, {}, None, formats=("pdf",))
+    assert os.path.exists(newest) and not os.path.exists(kept)
@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+import hedging
+from hedging import LatencyTracker, hedged_stream
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    tracker = LatencyTracker()
+    monkeypatch.setattr(hedging, "_tracker", tracker)
+    return tracker
+
+
+def fake_stream(first_token: dict, fail=()):
+    """A stream whose first token arrives after ``first_token[model]`` seconds."""
+    def stream(prompt, model, on_response=None):
+        time.sleep(first_token[model])
+        if model in fail:
+            raise ConnectionError(model)
+        yield from (model, "!")
+    return stream
+
+
+def test_deadline_uses_the_default_until_enough_samples():
+    tracker = LatencyTracker()
+    for _ in range(hedging.MIN_SAMPLES - 1):
+        tracker.record("m", 4.0)
+    assert tracker.deadline("m") == hedging.HEDGE_DEFAULT_DELAY
+    tracker.record("m", 4.0)
+    assert tracker.deadline("m") == 4.0
+
+
+def test_deadline_follows_the_percentile_within_its_bounds():
+    tracker = LatencyTracker()
+    for i in range(100):
+        tracker.record("m", (i + 1) / 10)
+    assert tracker.percentile("m", 50) == pytest.approx(5.0)
+    assert tracker.percentile("m", 95) == pytest.approx(9.5)
+    for seconds in (0.01, 1000.0):
+        bounded = LatencyTracker()
+        for _ in range(hedging.MIN_SAMPLES):
+            bounded.record("m", seconds)
+        assert hedging.HEDGE_MIN_DELAY <= bounded.deadline("m") <= hedging.HEDGE_MAX_DELAY
+
+
+def test_late_call_is_hedged_and_the_faster_attempt_wins(tracker, monkeypatch):
+    monkeypatch.setattr(hedging, "HEDGE_DEFAULT_DELAY", 0.05)
+    text, model = hedged_stream("p", "slow", fake_stream({"slow": 1.0, "fast": 0.0}), alternate="fast")
+    assert (text, model) == ("fast!", "fast")
+    counts = tracker.snapshot()["slow"]
+    assert (counts["hedges"], counts["hedge_wins"]) == (1, 1)
+    # The abandoned attempt still counts as a (censored) sample
+    assert counts["samples"] == 1 and tracker.snapshot()["fast"]["samples"] == 1
+
+
+def test_call_before_its_deadline_is_not_hedged(tracker, monkeypatch):
+    monkeypatch.setattr(hedging, "HEDGE_DEFAULT_DELAY", 5)
+    assert hedged_stream("p", "m", fake_stream({"m": 0.0}), alternate="other") == ("m!", "m")
+    assert tracker.snapshot()["m"]["hedges"] == 0
+
+
+def test_failed_call_falls_back_to_the_alternate(tracker, monkeypatch):
+    monkeypatch.setattr(hedging, "HEDGE_DEFAULT_DELAY", 5)
+    stream = fake_stream({"a": 0.0, "b": 0.0}, fail={"a"})
+    assert hedged_stream("p", "a", stream, alternate="b") == ("b!", "b")
+    counts = tracker.snapshot()["a"]
+    assert (counts["fallbacks"], counts["hedge_wins"]) == (1, 0)
@@ -0,0 +1,91 @@
+import io
+
+import pytest
+
+import image_scheduler
+import image_store
+from image_scheduler import ImageScheduler, PredictionFailed
+from image_store import ImageStore
+
+
+class Response:
+    retries = 0
+
+    def __init__(self, data=None, body=b""):
+        self.data, self.body = data, body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+    def iter_content(self, size):
+        for i in range(0, len(self.body), size):
+            yield self.body[i:i + size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class Transport:
+    """Replicate as a dict of canned replies, keyed by prediction ID."""
+
+    def __init__(self, created, polls, image=b""):
+        self.created, self.polls, self.image, self.cancelled = list(created), polls, image, []
+
+    def post(self, url, **kwargs):
+        if url.endswith("/cancel"):
+            self.cancelled.append(url)
+            return Response({})
+        return Response(self.created.pop(0))
+
+    def get(self, url, **kwargs):
+        if url.startswith("cdn:"):
+            return Response(body=self.image)
+        return Response(self.polls[url.rsplit("/", 1)[-1]])
+
+
+@pytest.fixture
+def replicate(monkeypatch, tmp_path):
+    monkeypatch.setattr(image_scheduler, "throttle", lambda provider: 0.0)
+    store = ImageStore(str(tmp_path))
+    monkeypatch.setattr(image_store, "_store", store)
+
+    def install(transport):
+        monkeypatch.setattr(image_scheduler, "get_transport", lambda: transport)
+        return ImageScheduler(base_url="https://replicate", poll_interval=0.01, timeout=5)
+    return install
+
+
+def png() -> bytes:
+    from PIL import Image
+    out = io.BytesIO()
+    Image.new("RGB", (32, 32), "navy").save(out, "PNG")
+    return out.getvalue()
+
+
+def test_prediction_is_polled_downloaded_and_stored(replicate):
+    transport = Transport([{"id": "a"}], {"a": {"status": "succeeded", "output": ["cdn:a.png"]}}, png())
+    handle = replicate(transport).submit("owner/model", {}).result(timeout=5)
+    assert handle.ext == "jpg"  # converted to the store's format
+
+
+def test_malformed_replies_fail_only_their_own_prediction(replicate):
+    transport = Transport([{"no": "id"}, {"id": "b"}, {"id": "c"}],
+                          {"b": ["not", "a", "dict"], "c": {"status": "succeeded", "output": "cdn:c.png"}}, png())
+    scheduler = replicate(transport)
+    futures = [scheduler.submit("owner/model", {}) for _ in range(3)]
+    assert isinstance(futures[0].exception(timeout=5), KeyError)
+    assert isinstance(futures[1].exception(timeout=5), AttributeError)
+    assert futures[2].result(timeout=5).ext == "jpg"
+    assert transport.cancelled == ["https://replicate/predictions/b/cancel"]
+
+
+def test_failed_prediction_raises(replicate):
+    transport = Transport([{"id": "d"}], {"d": {"status": "failed", "error": "NSFW"}})
+    with pytest.raises(PredictionFailed, match="NSFW"):
+        replicate(transport).submit("owner/model", {}).result(timeout=5)
@@ -0,0 +1,50 @@
+import os
+from io import BytesIO
+
+from PIL import Image
+
+from image_store import ImageStore
+
+
+def png(color: str) -> bytes:
+    buffered = BytesIO()
+    Image.new("RGB", (600, 800), color).save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def stored_files(root) -> list:
+    return sorted(name for _, _, names in os.walk(root) for name in names)
+
+
+def test_identical_images_share_one_file(tmp_path):
+    store = ImageStore(root=str(tmp_path))
+    first = store.put(Image.new("RGB", (600, 800), "red"))
+    assert store.put(Image.new("RGB", (600, 800), "red")) == first
+    assert store.put_bytes(store.read(first)) == first
+    assert stored_files(tmp_path) == sorted([f"{first.digest}.jpg", f"{first.digest}.thumb.jpg"])
+    assert store.put(Image.new("RGB", (600, 800), "blue")) != first
+
+
+def test_foreign_formats_are_reencoded_once(tmp_path):
+    store = ImageStore(root=str(tmp_path))
+    handle = store.put_bytes(png("white"))
+    assert handle.ext == "jpg" and store.put_bytes(png("white")) == handle
+    with Image.open(BytesIO(store.thumbnail(handle))) as thumb:
+        assert thumb.size == (384, 512)
+
+
+def test_missing_files_are_filled_from_sources(tmp_path):
+    store = ImageStore(root=str(tmp_path / "a"))
+    handle = store.put(Image.new("RGB", (600, 800), "red"))
+    data = store.read(handle)
+    other = ImageStore(root=str(tmp_path / "b"))
+    other.add_source(lambda digest: data if digest == handle.digest else None)
+    assert other.read(handle) == data and other.exists(handle)
+
+
+def test_streamed_download_matches_put_bytes(tmp_path):
+    store = ImageStore(root=str(tmp_path))
+    data = store.read(store.put(Image.new("RGB", (600, 800), "green")))
+    handle = store.put_stream(data[i:i + 100] for i in range(0, len(data), 100))
+    assert handle == store.put_bytes(data) and store.read(handle) == data
+    assert [name for name in stored_files(tmp_path) if name.endswith(".tmp")] == []
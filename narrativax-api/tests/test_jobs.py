@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+from jobs import EventChannel, JobManager, JobRejected
+
+
+def follow_fast(job):
+    return list(job.follow(coalesce=0, min_wait=0.05, max_wait=0.1))
+
+
+def test_finished_job_ends_with_complete():
+    manager = JobManager(workers=1)
+    job = manager.submit("s", lambda job: job.emit("✍️", "Writing", 0.5) or "book", {})
+    events = follow_fast(job)
+    assert events[-1][0] == "COMPLETE"
+    assert job.status == "done" and job.result == "book"
+
+
+def test_failed_job_ends_with_error():
+    def fail(job):
+        raise ValueError("no outline")
+
+    job = JobManager(workers=1).submit("s", fail, {})
+    assert follow_fast(job)[-1][:2] == ("ERROR", "Generation failed: no outline")
+    assert job.status == "failed"
+
+
+def test_cancelling_a_queued_job_ends_its_stream():
+    manager, release = JobManager(workers=1, per_session=2), threading.Event()
+    running = manager.submit("a", lambda job: release.wait(5), {})
+    queued = manager.submit("b", lambda job: "never", {})
+    try:
+        manager.cancel(queued.id)
+        assert follow_fast(queued)[-1][0] == "ERROR"
+        assert queued.status == "cancelled" and queued.cancelled.is_set()
+    finally:
+        release.set()
+    assert follow_fast(running)[-1][0] == "COMPLETE"
+    assert queued.result is None
+
+
+def test_cancel_reaches_a_running_job():
+    manager, started = JobManager(workers=1), threading.Event()
+
+    def run(job):
+        started.set()
+        if not job.cancelled.wait(5):
+            return "finished"
+        raise RuntimeError("Generation cancelled")
+
+    job = manager.submit("s", run, {})
+    started.wait(5)
+    manager.cancel(job.id)
+    assert follow_fast(job)[-1][0] == "ERROR"
+
+
+def test_admission_limits():
+    manager, release = JobManager(workers=1, max_queued=1, per_session=1), threading.Event()
+    manager.submit("a", lambda job: release.wait(5), {})
+    try:
+        with pytest.raises(JobRejected, match="already have"):
+            manager.submit("a", lambda job: None, {})
+        manager.submit("b", lambda job: None, {})
+        with pytest.raises(JobRejected, match="busy"):
+            manager.submit("c", lambda job: None, {})
+    finally:
+        release.set()
+
+
+def test_full_channel_drops_progress_but_keeps_terminal_events():
+    channel = EventChannel(maxlen=3)
+    for i in range(3):
+        channel.put(("✍️", str(i), 0.0, ""))
+    channel.put(("COMPLETE", "done", 1.0, ""))
+    channel.put(("✍️", "late", 1.0, ""))
+    events = channel.drain()
+    assert channel.dropped == 2
+    assert [e[0] for e in events].count("COMPLETE") == 1
+
+
+def test_job_nobody_follows_is_cancelled():
+    manager = JobManager(workers=1, abandon_after=0.2)
+    job = manager.submit("s", lambda job: "done" if not job.cancelled.wait(5) else None, {})
+    assert job.cancelled.wait(3)
+
+
+def test_followed_job_is_left_running():
+    manager = JobManager(workers=1, abandon_after=0.2)
+    job = manager.submit("s", lambda job: job.cancelled.wait(0.6) or "done", {})
+    assert follow_fast(job)[-1][0] == "COMPLETE"
+    assert job.result == "done" and not job.cancelled.is_set()
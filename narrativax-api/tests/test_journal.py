@@ -0,0 +1,80 @@
+from image_store import ImageHandle
+from journal import Journal
+
+
+def test_round_trip(tmp_path):
+    journal = Journal("job", root=str(tmp_path))
+    assert not journal.exists() and not journal.resumable()
+    journal.start({"prompt": "A lighthouse", "chapters": 3})
+    journal.record("outline", "Chapter 1 ...")
+    journal.record("image:cover", ImageHandle("ab" * 32, "jpg"))
+    assert journal.resumable()
+
+    config, completed, finished = Journal("job", root=str(tmp_path)).load()
+    assert config == {"prompt": "A lighthouse", "chapters": 3}
+    assert completed == {"outline": "Chapter 1 ...", "image:cover": ImageHandle("ab" * 32, "jpg")}
+    assert not finished
+
+    journal.complete()
+    assert journal.load()[2] and not journal.resumable()
+
+
+def test_torn_last_line_is_skipped_and_resume_appends_cleanly(tmp_path):
+    journal = Journal("job", root=str(tmp_path))
+    journal.start({"prompt": "p"})
+    journal.record("outline", "o")
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"step": "characters", "res')
+
+    resumed = Journal("job", root=str(tmp_path))
+    assert resumed.load()[1] == {"outline": "o"}
+    resumed.start({"prompt": "p"})
+    resumed.record("characters", [{"name": "Ada"}])
+    assert resumed.load()[1] == {"outline": "o", "characters": [{"name": "Ada"}]}
+
+
+def test_failed_image_is_not_journaled_and_is_retried_on_resume(monkeypatch, tmp_path):
+    from concurrent.futures import Future
+
+    import pipeline
+    from jobs import Job
+
+    monkeypatch.setattr(pipeline, "Journal", lambda job_id: Journal(job_id, root=str(tmp_path)))
+    monkeypatch.setattr(pipeline, "call_openrouter",
+                        lambda prompt, model, on_token=None, fresh=False: "[]" if "characters" in prompt else "Text.")
+    attempts, failing = [], {"cover"}
+
+    def submit_image(prompt, model_key, id_key, cache, group=None):
+        attempts.append(id_key)
+        done = Future()
+        done.set_result(None if id_key in failing else ImageHandle("f" * 64, "jpg"))
+        return done
+
+    monkeypatch.setattr(pipeline, "submit_image", submit_image)
+    config = {"prompt": "p", "genre": "Fantasy", "tone": "Mystical", "chapters": 1, "model": "m", "img_model": "x",
+              "journal_id": "job", "narrate": False}
+    result = pipeline.run_generation(Job("s", pipeline.run_generation, config))
+    assert result["cover"] is None and "cover" in attempts
+    completed = Journal("job", root=str(tmp_path)).load()[1]
+    assert "cover" not in completed and any(name.startswith("image:") for name in completed)
+
+    # Interrupt the journal, and add the None a version that journaled failures would have left
+    journal = Journal("job", root=str(tmp_path))
+    with open(journal.path, encoding="utf-8") as f:
+        lines = f.readlines()
+    with open(journal.path, "w", encoding="utf-8") as f:
+        f.writelines(lines[:-1])
+    journal.record("cover", None)
+
+    attempts.clear()
+    failing.clear()
+    result = pipeline.run_generation(Job("s", pipeline.run_generation, config))
+    assert attempts == ["cover"] and result["cover"] == ImageHandle("f" * 64, "jpg")
+
+
+def test_project_keeps_its_journal_id(tmp_path):
+    from project_store import ProjectStore
+
+    store = ProjectStore(str(tmp_path / "book.narrx"))
+    store.set_journal("job")
+    assert store.open_book()["journal_id"] == "job" and not store.exists()
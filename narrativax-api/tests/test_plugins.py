@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+from plugins import Registry
+
+
+def test_environment_entries_override_the_defaults(monkeypatch):
+    monkeypatch.setenv("NARRATIVAX_TEST_PLUGINS", " json = os.path:join , extra=os:getcwd,ignored")
+    registry = Registry("test plugin", "NARRATIVAX_TEST_PLUGINS", {"json": "json:dumps", "csv": "csv:reader"})
+    assert registry.get("json") is os.path.join
+    assert registry.get("extra") is os.getcwd
+    assert registry.names() == ["json", "csv", "extra"] and "ignored" not in registry
+
+
+def test_plugins_are_imported_on_first_use(monkeypatch):
+    monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+    registry = Registry("test plugin", defaults={"hls": "colorsys:rgb_to_hls"})
+    assert "colorsys" not in sys.modules
+    assert registry.get("hls")(1, 0, 0) == (0.0, 0.5, 1.0) and "colorsys" in sys.modules
+
+
+def test_register_replaces_a_loaded_plugin():
+    registry = Registry("test plugin", defaults={"pick": "builtins:min"})
+    assert registry.get("pick") is min
+    registry.register("pick", max)
+    assert registry.get("pick") is max
+    with pytest.raises(KeyError, match="available: pick"):
+        registry.get("missing")
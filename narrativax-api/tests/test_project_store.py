@@ -0,0 +1,73 @@
+import os
+
+import pytest
+from PIL import Image
+
+import project_store
+from image_store import ImageStore
+from project_store import ProjectStore, open_project
+
+
+@pytest.fixture
+def images(monkeypatch, tmp_path):
+    store = ImageStore(root=str(tmp_path / "images"))
+    monkeypatch.setattr(project_store, "get_image_store", lambda: store)
+    return store
+
+
+def test_save_writes_only_what_changed(images, tmp_path):
+    cover = images.put(Image.new("RGB", (8, 8), "red"))
+    store = ProjectStore(str(tmp_path / "book.narrx"))
+    book = {"Foreword": "Once.", "Chapter 1": "Twice."}
+    assert store.save(book, "outline", [], {"Chapter 1": cover}, cover) == {"sections": 2, "images": 1, "meta": 2}
+    assert store.save(book, "outline", [], {"Chapter 1": cover}, cover) == {"sections": 0, "images": 0, "meta": 0}
+
+    book["Chapter 1"] = "Thrice."
+    assert store.save(book, "outline", [], {}, cover) == {"sections": 1, "images": 0, "meta": 0}
+
+
+def test_open_book_reads_sections_on_first_use(images, tmp_path, monkeypatch):
+    store = ProjectStore(str(tmp_path / "book.narrx"))
+    store.save({"Foreword": "Once.", "Chapter 1": "Twice."}, "outline", [{"name": "Ada"}], {}, None, {"tone": "Dark"})
+    loaded = store.open_book()
+    reads = []
+    monkeypatch.setattr(store, "section", lambda name: reads.append(name) or ProjectStore.section(store, name))
+
+    book = loaded["book"]
+    assert list(book) == ["Foreword", "Chapter 1"] and reads == []
+    assert book["Chapter 1"] == "Twice." and reads == ["Chapter 1"]
+    assert loaded["characters"] == [{"name": "Ada"}] and loaded["config"] == {"tone": "Dark"}
+
+    # Sections never read are unchanged, so saving the book back leaves them alone
+    book["Chapter 1"] = "Again."
+    assert store.save(book, "outline", [{"name": "Ada"}], {}, None, {"tone": "Dark"})["sections"] == 1
+    assert reads == ["Chapter 1"]
+
+
+def test_readonly_store_never_creates_or_writes(images, tmp_path):
+    path = str(tmp_path / "missing.narrx")
+    with pytest.raises(FileNotFoundError):
+        ProjectStore(path, readonly=True)
+    assert not (tmp_path / "missing.narrx").exists()
+
+    ProjectStore(path).save({"Foreword": "Once."}, "outline", [], {}, None)
+    readonly = ProjectStore(path, readonly=True)
+    assert readonly.open_book()["book"]["Foreword"] == "Once."
+    with pytest.raises(PermissionError):
+        readonly.save({"Foreword": "Twice."}, "outline", [], {}, None)
+
+
+def test_open_project_closes_the_least_recently_used(images, monkeypatch, tmp_path):
+    monkeypatch.setattr(project_store, "PROJECT_DIR", str(tmp_path))
+    monkeypatch.setattr(project_store, "MAX_OPEN_PROJECTS", 2)
+    monkeypatch.setattr(project_store, "_projects", project_store.OrderedDict())
+    first = open_project("0" * 8)
+    first.exists()
+    open_project("1" * 8)
+    assert open_project("0" * 8) is first
+    open_project("2" * 8)
+    assert [os.path.basename(path) for path in project_store._projects] == ["00000000.narrx", "22222222.narrx"]
+    assert first._conn is not None
+
+    with pytest.raises(ValueError):
+        open_project("../etc")
@@ -0,0 +1,30 @@
+import time
+
+import pytest
+
+from ratelimit import SharedRateLimiter
+
+
+def test_unlimited_provider_never_waits():
+    limiter = SharedRateLimiter({"openrouter": 0})
+    assert all(limiter.acquire("openrouter") == 0.0 for _ in range(100))
+    assert limiter.acquire("unknown") == 0.0
+
+
+def test_burst_is_free_then_calls_are_spaced_by_the_rate():
+    limiter = SharedRateLimiter({"replicate": 600}, burst=2)  # ten per second
+    assert limiter.acquire("replicate") == 0.0
+    assert limiter.acquire("replicate") == 0.0
+    started = time.monotonic()
+    waited = limiter.acquire("replicate") + limiter.acquire("replicate")
+    assert waited == pytest.approx(0.2, abs=0.05)
+    assert time.monotonic() - started == pytest.approx(0.2, abs=0.1)
+
+
+def test_idle_bucket_refills_up_to_the_burst():
+    limiter = SharedRateLimiter({"replicate": 600}, burst=3)
+    for _ in range(3):
+        limiter.acquire("replicate")
+    time.sleep(0.5)
+    assert [limiter.acquire("replicate") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire("replicate") > 0
@@ -0,0 +1,98 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from scheduler import TaskGraph
+
+
+def test_tasks_run_after_their_dependencies_with_their_results():
+    graph, order = TaskGraph(), []
+
+    def step(name, value):
+        def run(*deps):
+            order.append(name)
+            return value + sum(deps)
+        return run
+
+    graph.add("a", step("a", 1))
+    graph.add("b", step("b", 10), deps=["a"])
+    graph.add("c", step("c", 100), deps=["a"])
+    graph.add("d", step("d", 1000), deps=["b", "c"])
+    results = graph.run()
+
+    assert results == {"a": 1, "b": 11, "c": 101, "d": 1112}
+    assert order[0] == "a" and order[-1] == "d"
+
+
+def test_provider_limit_caps_calls_in_flight():
+    graph, lock, state = TaskGraph(limits={"api": 2}, max_workers=8), threading.Lock(), {"now": 0, "peak": 0}
+
+    def call():
+        with lock:
+            state["now"] += 1
+            state["peak"] = max(state["peak"], state["now"])
+        time.sleep(0.05)
+        with lock:
+            state["now"] -= 1
+
+    for i in range(6):
+        graph.add(f"t{i}", call, provider="api")
+    graph.run()
+    assert state["peak"] == 2
+
+
+def test_unknown_dependency_and_cycle_are_rejected():
+    graph = TaskGraph()
+    graph.add("a", lambda: 1, deps=["missing"])
+    with pytest.raises(ValueError):
+        graph.run()
+
+    graph = TaskGraph()
+    graph.add("a", lambda b: 1, deps=["b"])
+    graph.add("b", lambda a: 1, deps=["a"])
+    with pytest.raises(RuntimeError):
+        graph.run()
+
+
+def test_failure_stops_tasks_not_yet_started():
+    graph, ran = TaskGraph(max_workers=1), []
+
+    def fail():
+        raise KeyError("boom")
+
+    graph.add("fail", fail)
+    graph.add("later", lambda _: ran.append("later"), deps=["fail"])
+    with pytest.raises(KeyError):
+        graph.run()
+    assert ran == []
+
+
+def test_cancel_returns_without_waiting_for_a_stuck_task():
+    graph, release = TaskGraph(), threading.Event()
+    graph.add("stuck", lambda: release.wait(10))
+    threading.Timer(0.2, graph.cancel).start()
+    started = time.monotonic()
+    try:
+        with pytest.raises(RuntimeError, match="cancelled"):
+            graph.run()
+        assert time.monotonic() - started < 3
+    finally:
+        release.set()
+
+
+def test_asynchronous_task_holds_its_dependants_until_it_settles():
+    graph, future = TaskGraph(), Future()
+    graph.add("image", lambda: future)
+    graph.add("after", lambda image: image.upper(), deps=["image"])
+    threading.Timer(0.1, future.set_result, ["done"]).start()
+    assert graph.run()["after"] == "DONE"
+
+
+def test_completed_tasks_are_skipped():
+    graph, calls = TaskGraph(), []
+    graph.add("a", lambda: calls.append("a") or 1)
+    graph.add("b", lambda a: calls.append("b") or a + 1, deps=["a"])
+    assert graph.run(completed={"a": 5}) == {"a": 5, "b": 6}
+    assert calls == ["b"]
@@ -0,0 +1,104 @@
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from transport import Transport, retry_after_seconds
+
+
+@pytest.fixture
+def server():
+    """A local server that answers each request with the next scripted ``(status, headers)``."""
+    script, seen = [], []
+
+    class Handler(BaseHTTPRequestHandler):
+        def _answer(self):
+            seen.append(self.command)
+            length = int(self.headers.get("Content-Length") or 0)
+            self.rfile.read(length)
+            status, headers = script.pop(0) if script else (200, {})
+            if status == "hang":
+                time.sleep(1)
+                status = 200
+            self.send_response(status)
+            for key, value in {"Content-Length": "2", **headers}.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        do_GET = do_POST = _answer
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}/", script, seen
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_post_is_retried_only_when_the_server_did_not_run_it(server):
+    url, script, seen = server
+    transport = Transport(backoff=0)
+    script += [(503, {"Retry-After": "0"}), (200, {})]
+    response = transport.post(url, json={})
+    assert response.status_code == 200 and response.retries == 1 and seen == ["POST", "POST"]
+
+    seen.clear()
+    script.append((500, {}))
+    assert transport.post(url, json={}).status_code == 500 and seen == ["POST"]
+
+
+def test_get_is_retried_on_any_retryable_status(server):
+    url, script, seen = server
+    script += [(500, {}), (504, {}), (200, {})]
+    response = Transport(backoff=0).get(url)
+    assert response.status_code == 200 and response.retries == 2 and len(seen) == 3
+
+
+def test_retries_stop_at_the_limit(server):
+    url, script, seen = server
+    script += [(503, {})] * 3
+    response = Transport(max_retries=1, backoff=0).post(url)
+    assert response.status_code == 503 and response.retries == 1 and len(seen) == 2
+
+
+def test_post_that_never_connected_is_retried(monkeypatch):
+    transport = Transport(max_retries=2, backoff=0, connect_timeout=1)
+    calls = []
+    real = transport.session.request
+
+    def request(method, url, **kwargs):
+        calls.append(method)
+        return real(method, url, **kwargs)
+
+    monkeypatch.setattr(transport.session, "request", request)
+    with pytest.raises(requests.ConnectionError):
+        # Nothing listens on port 9 locally, so the connection is refused before anything is sent
+        transport.post("http://127.0.0.1:9/")
+    assert calls == ["POST"] * 3
+
+
+def test_a_full_pool_times_out_instead_of_waiting_forever(server):
+    url, script, seen = server
+    transport = Transport(per_host_connections=1, max_retries=0, pool_timeout=0.2)
+    script.append(("hang", {}))
+    held = threading.Thread(target=transport.get, args=(url,))
+    held.start()
+    while not seen:
+        time.sleep(0.01)
+    started = time.monotonic()
+    with pytest.raises(requests.ConnectionError):
+        transport.post(url)
+    assert time.monotonic() - started < 0.9 and seen == ["GET"]
+    held.join()
+
+
+def test_retry_after_accepts_seconds_and_dates():
+    assert retry_after_seconds("3") == 3.0
+    assert retry_after_seconds(None) is None and retry_after_seconds("soon") is None
+    assert 55 < retry_after_seconds(formatdate(time.time() + 60, usegmt=True)) <= 60
@@ -0,0 +1,45 @@
+import threading
+
+from tts import AudioLibrary, TTSEngine, split_sentences
+
+
+def test_chunks_break_between_sentences():
+    text = "One two. Three four! Five six? Seven."
+    assert split_sentences(text, limit=20) == ["One two. Three four!", "Five six? Seven."]
+    assert split_sentences(text) == [text]
+    assert split_sentences("  ") == []
+
+
+def test_sentences_longer_than_the_limit_break_between_words():
+    chunks = split_sentences("Short. " + "word " * 10 + "end.", limit=16)
+    assert chunks[0] == "Short."
+    assert all(len(chunk) <= 16 for chunk in chunks)
+    assert " ".join(chunks).split() == ("Short. " + "word " * 10 + "end.").split()
+
+
+class CountingEngine(TTSEngine):
+    name = "counting"
+
+    def __init__(self):
+        self.chunks = []
+        self.release = threading.Event()
+
+    def synthesize(self, text: str, lang: str, voice: str) -> bytes:
+        self.release.wait(5)
+        self.chunks.append(text)
+        return text.encode("utf-8")
+
+
+def test_narration_is_rendered_once_and_cached(tmp_path):
+    engine = CountingEngine()
+    library = AudioLibrary(engine, root=str(tmp_path))
+    text = "First sentence. " * 200
+    futures = [library.submit(text) for _ in range(3)]
+    assert futures[0] is futures[1] is futures[2]
+    engine.release.set()
+    path = futures[0].result(timeout=5)
+
+    assert library.cached(text) == path and library.synthesize(text) == path
+    assert len(engine.chunks) == len(split_sentences(text)) > 1
+    with open(path, "rb") as f:
+        assert f.read() == "".join(split_sentences(text)).encode("utf-8")
@@ -0,0 +1,54 @@
+import viewer
+from image_store import ImageHandle
+from viewer import PAGE_CHARS, paginate, view_section
+
+
+def test_pages_break_between_paragraphs():
+    paragraph = "x" * (PAGE_CHARS // 4)
+    pages = paginate("\n\n".join([paragraph] * 7))
+    assert len(pages) == 3
+    assert all(len(page) <= PAGE_CHARS + 2 for page in pages)
+    assert "".join(pages).split() == [paragraph] * 7
+
+
+def test_pages_are_escaped_and_never_empty():
+    assert paginate("<b>Bold</b> & more\n\n\n") == ["&lt;b&gt;Bold&lt;/b&gt; &amp; more\n\n"]
+    assert paginate("") == [""]
+    assert paginate("y" * (PAGE_CHARS * 2)) == ["y" * (PAGE_CHARS * 2) + "\n\n"]
+
+
+class Library:
+    def __init__(self, cached=()):
+        self._cached, self.submitted = set(cached), []
+
+    def cached(self, text):
+        return f"{text}.mp3" if text in self._cached else None
+
+    def submit(self, text):
+        self.submitted.append(text)
+
+
+class Store:
+    def __init__(self):
+        self.thumbnails = []
+
+    def thumbnail(self, handle):
+        self.thumbnails.append(handle)
+        return b"jpg"
+
+
+def test_view_section_queues_only_this_and_the_next_narration(monkeypatch):
+    library = Library(cached={"Two."})
+    monkeypatch.setattr(viewer, "get_audio_library", lambda: library)
+    store = Store()
+    monkeypatch.setattr(viewer, "get_image_store", lambda: store)
+    book = {"Foreword": "One.", "Chapter 1": "Two.", "Chapter 2": "Three.", "Epilogue": "Four."}
+    handle = ImageHandle("a" * 64, "jpg")
+
+    view = view_section(book, "Chapter 1", {"Chapter 1": handle})
+    assert view == viewer.SectionView(["Two.\n\n"], "Two..mp3", b"jpg") and store.thumbnails == [handle]
+    assert library.submitted == ["Three."]
+
+    view = view_section(book, "Epilogue", {"Chapter 1": handle})
+    assert view.audio_path is None and view.thumbnail is None
+    assert library.submitted == ["Three.", "Four."]
@@ -0,0 +1,166 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, EmptyPoolError, NewConnectionError
+
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+# A POST may already have been run, and billed, by the time it fails; these statuses say it was not
+POST_RETRY_STATUSES = {408, 425, 429, 502, 503}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+CONNECT_TIMEOUT = float(os.getenv("NARRATIVAX_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("NARRATIVAX_READ_TIMEOUT", "60"))
+POOL_TIMEOUT = float(os.getenv("NARRATIVAX_POOL_TIMEOUT", "30"))
+
+
+def before_send(error: Exception) -> bool:
+    """Whether a request failed while connecting, so the server never saw it."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError) and error.args:
+        reason = getattr(error.args[0], "reason", error.args[0])
+        return isinstance(reason, (NewConnectionError, ConnectTimeoutError, EmptyPoolError))
+    return False
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class BoundedPool:
+    pool_timeout = POOL_TIMEOUT
+
+    def _get_conn(self, timeout=None):
+        # urlopen passes its own pool_timeout, which requests always leaves as None
+        return super()._get_conn(self.pool_timeout if timeout is None else timeout)
+
+
+class BoundedPoolAdapter(HTTPAdapter):
+    """``HTTPAdapter`` whose blocking pools wait at most ``pool_timeout`` for a free connection.
+
+    requests never passes urllib3 a pool timeout, so with ``pool_block`` a
+    request would otherwise queue forever behind a wedged one. Running out of
+    time raises ``requests.ConnectionError``, which ``before_send`` counts as
+    never sent.
+    """
+    __attrs__ = HTTPAdapter.__attrs__ + ["pool_timeout"]
+
+    def __init__(self, pool_timeout: float, **kwargs):
+        self.pool_timeout = pool_timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        bounded = {"pool_timeout": self.pool_timeout}
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type("BoundedHTTPConnectionPool", (BoundedPool, HTTPConnectionPool), bounded),
+            "https": type("BoundedHTTPSConnectionPool", (BoundedPool, HTTPSConnectionPool), bounded),
+        }
+
+    def send(self, request, **kwargs):
+        try:
+            return super().send(request, **kwargs)
+        except EmptyPoolError as e:
+            raise requests.ConnectionError(e, request=request)
+
+
+class Transport:
+    """Shared HTTP client: one pooled keep-alive session for every provider.
+
+    ``request`` retries connection errors, timeouts and retryable statuses with
+    exponential backoff and full jitter, honouring ``Retry-After`` when the
+    server sends one. Non-idempotent requests (POSTs to completion and
+    prediction endpoints) are retried only when they never reached the
+    server or it reports not having run them, since a retry could pay twice.
+    """
+
+    def __init__(
+        self,
+        per_host_connections: int = 32,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        read_timeout: float = READ_TIMEOUT,
+        pool_timeout: float = POOL_TIMEOUT,
+    ):
+        self.per_host_connections = per_host_connections
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        # pool_block caps each host at per_host_connections sockets instead of opening extras
+        adapter = BoundedPoolAdapter(pool_timeout, pool_connections=16, pool_maxsize=per_host_connections,
+                                     pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        if response is not None:
+            retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(retry_after, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def request(self, method: str, url: str, timeout=None, **kwargs) -> requests.Response:
+        timeout = timeout or self.timeout
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        statuses = RETRY_STATUSES if idempotent else POST_RETRY_STATUSES
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries or not (idempotent or before_send(e)):
+                    raise
+                time.sleep(self._delay(attempt))
+            else:
+                if response.status_code not in statuses or attempt >= self.max_retries:
+                    response.retries = attempt
+                    return response
+                delay = self._delay(attempt, response)
+                response.close()
+                time.sleep(delay)
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> Transport:
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport(
+                # Room for every job's OpenRouter streams plus their hedges (4 jobs x 4 streams x 2), so time
+                # spent queueing for a pooled socket never reads as a slow first token
+                per_host_connections=int(os.getenv("NARRATIVAX_PER_HOST_CONNECTIONS", "32")),
+                max_retries=int(os.getenv("NARRATIVAX_MAX_RETRIES", "4")),
+            )
+        return _transport
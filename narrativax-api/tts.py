@@ -0,0 +1,151 @@
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from metrics import span
+from plugins import TTS_ENGINES
+
+AUDIO_DIR = os.getenv("NARRATIVAX_AUDIO_DIR", os.path.join(os.getenv("NARRATIVAX_CACHE_DIR", ".narrativax_cache"), "audio"))
+TTS_WORKERS = int(os.getenv("NARRATIVAX_TTS_WORKERS", "4"))
+CHUNK_CHARS = 1200
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+class TTSEngine:
+    """Turns one chunk of text into MP3 bytes. Subclass to plug in another backend."""
+    name = "base"
+
+    def synthesize(self, text: str, lang: str, voice: str) -> bytes:
+        raise NotImplementedError
+
+
+class GTTSEngine(TTSEngine):
+    name = "gtts"
+
+    def synthesize(self, text: str, lang: str, voice: str) -> bytes:
+        from gtts import gTTS
+        buffered = BytesIO()
+        # gTTS picks its accent through the Google domain, so the voice is a tld
+        gTTS(text=text, lang=lang, tld=voice or "com").write_to_fp(buffered)
+        return buffered.getvalue()
+
+
+class SilentEngine(TTSEngine):
+    """Offline stand-in that emits silent MPEG frames sized to the text."""
+    name = "silent"
+    # 128 kbps / 44.1 kHz MPEG-1 Layer III frame header; a zeroed body decodes as silence
+    FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+    def synthesize(self, text: str, lang: str, voice: str) -> bytes:
+        return self.FRAME * max(1, len(text) // 15)
+
+
+def split_sentences(text: str, limit: int = CHUNK_CHARS) -> List[str]:
+    """Split text into chunks of at most ``limit`` chars, breaking between sentences."""
+    chunks, current = [], ""
+    for sentence in SENTENCE_END.split(text.strip()):
+        while len(sentence) > limit:
+            cut = sentence.rfind(" ", 0, limit)
+            cut = cut if cut > 0 else limit
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if current and len(current) + 1 + len(sentence) > limit:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def audio_key(text: str, lang: str, voice: str) -> str:
+    return hashlib.sha256(f"{lang}\0{voice}\0{text}".encode("utf-8")).hexdigest()
+
+
+class AudioLibrary:
+    """Cached, parallel narration shared by the viewer and the exporter.
+
+    MP3s are stored under a hash of (text, lang, voice). Long texts are split
+    at sentence boundaries and the chunks rendered concurrently; MP3 frames
+    concatenate cleanly, so the chunk outputs are simply joined. Concurrent
+    requests for the same audio share one in-flight job.
+    """
+
+    def __init__(self, engine: TTSEngine, root: str = AUDIO_DIR, workers: int = TTS_WORKERS):
+        self.engine = engine
+        self.root = root
+        self._books = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts-book")
+        self._chunks = ThreadPoolExecutor(max_workers=workers * 2, thread_name_prefix="tts-chunk")
+        self._pending: Dict[str, Future] = {}
+        # Re-entrant: a job that finishes instantly runs its done-callback while submit holds the lock
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, text: str, lang: str = "en", voice: str = "com") -> str:
+        # One directory per engine, so a stand-in never serves its output to the real one
+        return os.path.join(self.root, self.engine.name, f"{audio_key(text, lang, voice)}.mp3")
+
+    def cached(self, text: str, lang: str = "en", voice: str = "com") -> Optional[str]:
+        path = self.path(text, lang, voice)
+        return path if os.path.exists(path) else None
+
+    def _render(self, text: str, lang: str, voice: str, path: str) -> str:
+        with span("tts", provider=self.engine.name) as timer:
+            chunks = split_sentences(text)
+            futures = [self._chunks.submit(self.engine.synthesize, chunk, lang, voice) for chunk in chunks]
+            audio = b"".join(f.result() for f in futures)
+            timer.add(bytes=len(audio))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(audio)
+        os.replace(tmp, path)
+        return path
+
+    def submit(self, text: str, lang: str = "en", voice: str = "com") -> Future:
+        path = self.path(text, lang, voice)
+        with self._lock:
+            if os.path.exists(path):
+                done = Future()
+                done.set_result(path)
+                return done
+            if path not in self._pending:
+                future = self._books.submit(self._render, text, lang, voice, path)
+                future.add_done_callback(lambda _, path=path: self._forget(path))
+                self._pending[path] = future
+            return self._pending[path]
+
+    def _forget(self, path: str):
+        with self._lock:
+            self._pending.pop(path, None)
+
+    def synthesize(self, text: str, lang: str = "en", voice: str = "com") -> str:
+        return self.submit(text, lang, voice).result()
+
+    def prefetch(self, texts, lang: str = "en", voice: str = "com"):
+        for text in texts:
+            self.submit(text, lang, voice)
+
+
+_library = None
+_library_lock = threading.Lock()
+
+
+def get_audio_library() -> AudioLibrary:
+    global _library
+    with _library_lock:
+        if _library is None:
+            _library = AudioLibrary(TTS_ENGINES.get(os.getenv("NARRATIVAX_TTS_ENGINE", "gtts"))())
+        return _library
+
+
+def set_tts_engine(engine: TTSEngine):
+    get_audio_library().engine = engine
@@ -0,0 +1,47 @@
+from html import escape
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from image_store import get_image_store
+from tts import get_audio_library
+
+PAGE_CHARS = 3500  # roughly a printed page; long chapters are split so one rerun renders one page
+
+
+class SectionView(NamedTuple):
+    pages: List[str]
+    audio_path: Optional[str]
+    thumbnail: Optional[bytes]
+
+
+def paginate(content: str) -> List[str]:
+    """Escaped markdown pages of at most ``PAGE_CHARS``, broken between paragraphs."""
+    pages, current = [], ""
+    for paragraph in (p.strip() for p in content.split("\n")):
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) > PAGE_CHARS:
+            pages.append(current)
+            current = ""
+        current += escape(paragraph) + "\n\n"
+    return pages + [current] if current or not pages else pages
+
+
+def view_section(book: Dict[str, str], section: str, image_cache: dict,
+                 pages: Callable[[str], List[str]] = paginate) -> SectionView:
+    """Everything the reader needs to draw ``section``, and nothing for the sections it skips.
+
+    Narration that isn't rendered yet is queued, and so is the next
+    section's, so it is ready by the time the reader gets there. ``main.py``
+    passes a memoized ``pages``; bench.py uses this directly.
+    """
+    sections = list(book)
+    index = sections.index(section)
+    content = book[section]
+    library = get_audio_library()
+    audio_path = library.cached(content)
+    if audio_path is None:
+        library.submit(content)
+    if index + 1 < len(sections):
+        library.submit(book[sections[index + 1]])
+    thumbnail = get_image_store().thumbnail(image_cache[section]) if section in image_cache else None
+    return SectionView(pages(content), audio_path, thumbnail)